@@ -1,11 +1,194 @@
-from typing import List, Optional
+from typing import Any, Deque, Dict, List, Optional
+from collections import deque
+import asyncio
+import hashlib
 import os
-import json
+import time
+import httpx
+import orjson
+from cachetools import TTLCache
+from pydantic import BaseModel, Field
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart
 from ddgs import DDGS
 
+# Upper bound on a single disk round-trip so a stuck filesystem can't hang the agent
+FILE_IO_TIMEOUT = 10.0
+
+# Serialized web_search results keyed by normalized query, so repeat searches skip DuckDuckGo
+_search_cache: TTLCache = TTLCache(maxsize=512, ttl=600)
+
+# How long to wait after an update before flushing, so bursts of tool calls coalesce into one write
+FLUSH_DELAY = 0.25
+
+# Once the append-only update log grows past this size it is folded back into the JSON snapshot
+COMPACT_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+# Conversation turns kept verbatim; once full, the oldest SUMMARIZE_BATCH turns are folded into a summary
+MAX_HISTORY_TURNS = 20
+SUMMARIZE_BATCH = 10
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You compress chat transcripts. Summarize the conversation you are given into a short list of facts, "
+    "user preferences, decisions and open questions needed to continue it. Keep hotel IDs and names exact."
+)
+
+BASE_SYSTEM_PROMPT = "You are a helpful chat bot with memory. You remember details from the conversation."
+
+TOOL_INSTRUCTIONS = (
+    "\n\nHotel data is not included in this prompt. Use the `list_hotels` tool to browse or filter the "
+    "loaded hotels and the `get_hotel` tool to fetch the full record (address, coordinates, etc.) for a hotel. "
+    "Use that data to answer questions. If the answer is not explicitly in the data "
+    "(e.g., proximity to landmarks like parks), use your general knowledge based on the "
+    "address or coordinates of the hotel.\n\n"
+    "IMPORTANT: When you determine that specific hotels match a user's criteria (e.g., are near a park), "
+    "you MUST use the `update_hotel_record` tool to update the records for those specific hotels. "
+    "Infer the `field_name` from the question (e.g., 'situated_near_park') and provide a 'justification'. "
+    "When several hotels need updating, prefer a single `update_hotel_records` call with all of the updates."
+    "\n\nYou also have access to a `web_search` tool. Use it to find information about the hotels, their surroundings, or any other general knowledge questions the user asks if you don't know the answer."
+)
+
+
+def _load_json_file(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+def _dump_json_file(path: str, data: Any):
+    # Write to a temp file and swap it in so readers never see a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+
+def _load_ndjson_file(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # A torn final line from an interrupted write; everything before it is intact
+                continue
+    return entries
+
+
+def _append_ndjson(f, entries: List[Dict[str, Any]]) -> int:
+    f.write(b"".join(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE) for entry in entries))
+    f.flush()
+    return f.tell()
+
+
+def _ddg_search(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    with DDGS() as ddgs:
+        return list(ddgs.text(query, max_results=max_results))
+
+
+async def _read_json(path: str) -> Any:
+    """Read and parse a JSON file without blocking the event loop"""
+    return await asyncio.wait_for(asyncio.to_thread(_load_json_file, path), FILE_IO_TIMEOUT)
+
+
+async def _read_ndjson(path: str) -> List[Dict[str, Any]]:
+    """Read an NDJSON log without blocking the event loop"""
+    return await asyncio.wait_for(asyncio.to_thread(_load_ndjson_file, path), FILE_IO_TIMEOUT)
+
+
+async def _write_json(path: str, data: Any):
+    """Serialize and write a JSON file without blocking the event loop"""
+    await asyncio.wait_for(asyncio.to_thread(_dump_json_file, path, data), FILE_IO_TIMEOUT)
+
+
+class HotelUpdateArgs(BaseModel):
+    hotel_id: str = Field(..., description="The ID of the hotel to update.")
+    field_name: str = Field(..., description="The inferred boolean field name.")
+    value: bool = Field(..., description="True or False.")
+    justification: str = Field(..., description="The reason for this value.")
+    
+    # This configuration helps prevent 'additionalProperties' from appearing in the generated JSON schema,
+    # which causes 400 errors with the Gemini API.
+    model_config = {'extra': 'ignore'}
+
+
+class HotelBatchUpdateArgs(BaseModel):
+    updates: List[HotelUpdateArgs] = Field(..., description="The hotel updates to apply.")
+    model_config = {'extra': 'ignore'}
+
+
+class ListHotelsArgs(BaseModel):
+    limit: int = Field(50, description="The maximum number of hotels to return.")
+    filter_text: Optional[str] = Field(None, description="Only return hotels whose name or address contains this text.")
+    model_config = {'extra': 'ignore'}
+
+
+class GetHotelArgs(BaseModel):
+    hotel_id: str = Field(..., description="The ID of the hotel to fetch.")
+    model_config = {'extra': 'ignore'}
+
+
+class SearchArgs(BaseModel):
+    query: str = Field(..., description="The search query to submit to the search engine.")
+    model_config = {'extra': 'ignore'}
+
+
+async def list_hotels(ctx: RunContext["ChatBot"], args: ListHotelsArgs) -> List[Dict[str, Any]]:
+    """
+    List the loaded hotels (id, name and any recorded fields), optionally filtered by name or address.
+    """
+    return ctx.deps._list_hotels(args.limit, args.filter_text)
+
+
+async def get_hotel(ctx: RunContext["ChatBot"], args: GetHotelArgs) -> Dict[str, Any]:
+    """
+    Get the full record for a specific hotel, including any fields recorded with `update_hotel_record`.
+    """
+    return ctx.deps._get_hotel(args.hotel_id)
+
+
+async def web_search(ctx: RunContext["ChatBot"], args: SearchArgs) -> str:
+    """
+    Perform a web search to find information not present in the context.
+    """
+    cache_key = " ".join(args.query.lower().split())
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        # DDGS is a blocking client; run it in a worker thread so the loop keeps serving
+        results = await asyncio.to_thread(_ddg_search, args.query)
+        # Compact JSON: the model doesn't need the whitespace and it costs tokens
+        output = orjson.dumps(results).decode() if results else "No results found."
+        _search_cache[cache_key] = output
+        return output
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+
+async def update_hotel_record(ctx: RunContext["ChatBot"], args: HotelUpdateArgs) -> str:
+    """
+    Updates the record for a specific hotel in the consolidated file.
+    """
+    return await ctx.deps._apply_hotel_update(args)
+
+
+async def update_hotel_records(ctx: RunContext["ChatBot"], args: HotelBatchUpdateArgs) -> str:
+    """
+    Updates the records for several hotels in the consolidated file in one call.
+    """
+    # Collapse duplicate (hotel_id, field_name, value) updates so each is applied once
+    unique_updates: Dict[tuple, HotelUpdateArgs] = {}
+    for update in args.updates:
+        unique_updates.setdefault((update.hotel_id, update.field_name, update.value), update)
+    results = await asyncio.gather(*(ctx.deps._apply_hotel_update(u) for u in unique_updates.values()))
+    return "\n".join(results)
+
+
 class ChatBot:
     def __init__(self, model_name: str = 'gemini-2.5-flash', api_key: Optional[str] = None):
         if api_key:
@@ -13,31 +196,214 @@ class ChatBot:
         elif not os.getenv('GEMINI_API_KEY'):
              raise ValueError("GEMINI_API_KEY environment variable not set")
         
-        self.model = GeminiModel(model_name)
-        self.system_prompt = "You are a helpful chat bot with memory. You remember details from the conversation."
+        # One pooled async client for every Gemini call so requests never block the loop
+        # and concurrent chats reuse connections instead of re-handshaking
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+        self.model = GeminiModel(model_name, provider=GoogleGLAProvider(http_client=self._http))
+        self.system_prompt = BASE_SYSTEM_PROMPT
         self.agent = Agent(self.model, system_prompt=self.system_prompt)
-        self.history: List[ModelMessage] = []
+        self._context_sections: Dict[str, str] = {}
+        self._agent_cache: Dict[str, Agent] = {}
+        # Each entry holds the messages of one chat turn, so tool calls and their results are never split
+        self.history: Deque[List[ModelMessage]] = deque(maxlen=MAX_HISTORY_TURNS)
+        self._summary: Optional[str] = None
+        # Set once the first turn (which carried the system prompt) has left the history
+        self._evicted = False
+        self._summary_agent = Agent(self.model, system_prompt=SUMMARY_SYSTEM_PROMPT)
         self.hotel_data_dir = "hotel_data"
+        
+        # In-memory source of truth for consolidated records, flushed to disk in the background
+        self._consolidated: Dict[str, Dict[str, Any]] = {}
+        # Hotels from the loaded context files, served to the agent through the lookup tools
+        self._hotels: Dict[str, Dict[str, Any]] = {}
+        # Content-addressed pool of nested hotel values (amenity lists, chain addresses, ...) shared across hotels
+        self._intern_pool: Dict[bytes, Any] = {}
+        self._dirty = asyncio.Event()
+        # Set by aclose so the flusher finishes its current write and exits instead of being cancelled
+        self._closing = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Updates not yet appended to the on-disk log, and the log opened once in append mode
+        self._pending_log: List[Dict[str, Any]] = []
+        self._log_file = None
+        # Serializes log appends, snapshot writes and log truncation across the flusher and callers
+        self._io_lock = asyncio.Lock()
+
+    async def _flush_loop(self):
+        """Persist consolidated record updates whenever they change, coalescing bursts of updates"""
+        while not self._closing.is_set():
+            await self._dirty.wait()
+            # Coalesce the burst, but stop waiting as soon as aclose asks the loop to finish
+            try:
+                await asyncio.wait_for(self._closing.wait(), FLUSH_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            try:
+                await self._flush_pending()
+            except Exception as e:
+                print(f"Warning: Could not write consolidated updates: {e}")
+
+    async def _flush_pending(self):
+        """Append pending updates to the NDJSON log, compacting it when it grows too large"""
+        async with self._io_lock:
+            entries, self._pending_log = self._pending_log, []
+            if not entries:
+                return
+            try:
+                log_size = await asyncio.wait_for(
+                    asyncio.to_thread(_append_ndjson, self._log_file, entries), FILE_IO_TIMEOUT
+                )
+            except BaseException:
+                # Includes cancellation, so drained entries are never dropped
+                self._pending_log[:0] = entries
+                raise
+            if log_size > COMPACT_THRESHOLD_BYTES:
+                await self._compact_locked()
+
+    async def _compact(self):
+        """Write the full snapshot and truncate the update log it now covers"""
+        async with self._io_lock:
+            await self._compact_locked()
+
+    async def _compact_locked(self):
+        """_compact body; the caller holds _io_lock so no append lands between snapshot and truncate"""
+        # Copy on the loop thread so tool calls can keep mutating records while the worker serializes
+        snapshot = {h_id: dict(record) for h_id, record in self._consolidated.items()}
+        await _write_json(self.consolidated_file, snapshot)
+        await asyncio.to_thread(self._log_file.truncate, 0)
+
+    async def aclose(self):
+        """Stop the background flusher, write any pending updates and close the Gemini client"""
+        if self._flush_task:
+            # Let the loop finish any in-flight append rather than cancelling it mid-write
+            self._closing.set()
+            self._dirty.set()
+            await self._flush_task
+            self._flush_task = None
+        if self._log_file:
+            self._dirty.clear()
+            await self._flush_pending()
+            self._log_file.close()
+            self._log_file = None
+        await self._http.aclose()
+
+    def _get_agent(self, system_prompt: str) -> Agent:
+        """Return the tool-enabled agent for a system prompt, building it only once per prompt"""
+        prompt_hash = hashlib.blake2b(system_prompt.encode()).hexdigest()
+        agent = self._agent_cache.get(prompt_hash)
+        if agent is None:
+            agent = Agent(
+                self.model,
+                deps_type=ChatBot,
+                system_prompt=system_prompt,
+                tools=[list_hotels, get_hotel, update_hotel_record, update_hotel_records, web_search]
+            )
+            self._agent_cache[prompt_hash] = agent
+        return agent
+
+    def _intern_hotel(self, hotel: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace nested values with a shared instance of any identical value seen before"""
+        interned = {}
+        for key, value in hotel.items():
+            if isinstance(value, (dict, list)) and value:
+                fingerprint = hashlib.blake2b(orjson.dumps(value, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+                value = self._intern_pool.setdefault(fingerprint, value)
+            interned[key] = value
+        return interned
+
+    def _list_hotels(self, limit: int, filter_text: Optional[str]) -> List[Dict[str, Any]]:
+        needle = filter_text.lower() if filter_text else None
+        matches = []
+        for h_id, hotel in self._hotels.items():
+            if needle and needle not in f"{hotel.get('name', '')} {hotel.get('address', '')}".lower():
+                continue
+            record = self._consolidated.get(h_id, {})
+            matches.append({
+                "hotel_id": h_id,
+                "name": hotel.get("name"),
+                **{k: v for k, v in record.items() if k not in ("hotel_id", "hotel_name")}
+            })
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def _get_hotel(self, hotel_id: str) -> Dict[str, Any]:
+        hotel = self._hotels.get(hotel_id)
+        if hotel is None:
+            return {"error": f"Hotel ID {hotel_id} not found."}
+        return {**hotel, "recorded_fields": self._consolidated.get(hotel_id, {})}
 
-    def load_json_context(self, file_path: str):
+    async def _apply_hotel_update(self, args: HotelUpdateArgs) -> str:
+        hotel_id = args.hotel_id
+        field_name = args.field_name
+        value = args.value
+        justification = args.justification
+
+        record = self._consolidated.get(hotel_id)
+        if record is None:
+            return f"Error: Hotel ID {hotel_id} not found in records."
+        
+        # Repeated calls with the same update (common within one turn) don't produce another log write
+        if record.get(field_name) == value and record.get("justification") == justification:
+            return f"Record for {hotel_id} is already up to date."
+        
+        record[field_name] = value
+        record["justification"] = justification
+        
+        # Appended to the update log by the background flusher
+        self._pending_log.append({
+            "hotel_id": hotel_id,
+            "field_name": field_name,
+            "value": value,
+            "justification": justification,
+            "ts": time.time()
+        })
+        self._dirty.set()
+        return f"Successfully updated record for {hotel_id}."
+
+    async def load_json_context(self, file_path: str):
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            
             # 1. Initialize Consolidated Hotel File
             self.consolidated_file = "consolidated_hotels.json"
+            self.consolidated_log = "consolidated_hotels.ndjson"
+            
+            # Persist anything still pending before the snapshot is reloaded
+            if self._log_file:
+                await self._flush_pending()
+            
+            # Read the context file, the consolidated snapshot and its update log concurrently
+            async def read_optional(reader, path):
+                return await reader(path) if os.path.exists(path) else None
+            
+            data, consolidated_data, log_entries = await asyncio.gather(
+                _read_json(file_path),
+                read_optional(_read_json, self.consolidated_file),
+                read_optional(_read_ndjson, self.consolidated_log),
+                return_exceptions=True
+            )
+            if isinstance(data, BaseException):
+                raise data
             
             hotels = data.get("hotels", [])
             
-            # Load existing consolidated data if file exists, otherwise start fresh
-            consolidated_data = {}
-            if os.path.exists(self.consolidated_file):
-                try:
-                    with open(self.consolidated_file, 'r') as hf:
-                        consolidated_data = json.load(hf)
-                except Exception as e:
-                    print(f"Warning: Could not load existing consolidated file: {e}. Starting fresh.")
-                    consolidated_data = {}
+            # Use existing consolidated data if file was read, otherwise start fresh
+            if isinstance(consolidated_data, BaseException):
+                print(f"Warning: Could not load existing consolidated file: {consolidated_data}. Starting fresh.")
+                consolidated_data = None
+            consolidated_data = consolidated_data or {}
+            
+            # Replay updates logged since the last compaction
+            if isinstance(log_entries, BaseException):
+                print(f"Warning: Could not read consolidated update log: {log_entries}")
+                log_entries = None
+            for entry in log_entries or []:
+                record = consolidated_data.get(entry.get("hotel_id"))
+                if record is not None:
+                    record[entry["field_name"]] = entry["value"]
+                    record["justification"] = entry["justification"]
             
             # Merge/update with hotels from input data
             for hotel in hotels:
@@ -57,97 +423,70 @@ class ChatBot:
                             "hotel_id": h_id
                         }
             
-            with open(self.consolidated_file, 'w') as hf:
-                json.dump(consolidated_data, hf, indent=2)
-
-            context_str = json.dumps(data, indent=2)
-            self.system_prompt += (
-                f"\n\nHere is some context from a file:\n{context_str}\n\n"
-                "Use this context to answer questions. If the answer is not explicitly in the file "
-                "(e.g., proximity to landmarks like parks), use your general knowledge based on the "
-                "address or coordinates provided in the file.\n\n"
-                "IMPORTANT: When you determine that specific hotels match a user's criteria (e.g., are near a park), "
-                "you MUST use the `update_hotel_record` tool to update the records for those specific hotels. "
-                "Infer the `field_name` from the question (e.g., 'situated_near_park') and provide a 'justification'."
-                "\n\nYou also have access to a `web_search` tool. Use it to find information about the hotels, their surroundings, or any other general knowledge questions the user asks if you don't know the answer."
-            )
+            self._consolidated = consolidated_data
+            if self._log_file is None:
+                self._log_file = await asyncio.to_thread(open, self.consolidated_log, 'ab')
+            await self._compact()
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_loop())
+
+            self._hotels.update((h["hotel_id"], self._intern_hotel(h)) for h in hotels if h.get("hotel_id"))
             
-            # 2. Define Tool
-            # 2. Define Tool
-            from pydantic import BaseModel, Field
+            # Hotels are served through the lookup tools; only the (small) remainder of the file goes in the prompt
+            other_context = {k: v for k, v in data.items() if k != "hotels"}
+            if other_context:
+                self._context_sections[file_path] = f"\n\nHere is some context from a file:\n{orjson.dumps(other_context).decode()}"
+            else:
+                self._context_sections.pop(file_path, None)
+            self.system_prompt = BASE_SYSTEM_PROMPT + "".join(self._context_sections.values()) + TOOL_INSTRUCTIONS
             
-            class HotelUpdateArgs(BaseModel):
-                hotel_id: str = Field(..., description="The ID of the hotel to update.")
-                field_name: str = Field(..., description="The inferred boolean field name.")
-                value: bool = Field(..., description="True or False.")
-                justification: str = Field(..., description="The reason for this value.")
-                
-                # This configuration helps prevent 'additionalProperties' from appearing in the generated JSON schema,
-                # which causes 400 errors with the Gemini API.
-                model_config = {'extra': 'ignore'}
-
-            class SearchArgs(BaseModel):
-                query: str = Field(..., description="The search query to submit to the search engine.")
-                model_config = {'extra': 'ignore'}
-
-            def web_search(ctx: RunContext[None], args: SearchArgs) -> str:
-                """
-                Perform a web search to find information not present in the context.
-                """
-                try:
-                    with DDGS() as ddgs:
-                        results = list(ddgs.text(args.query, max_results=5))
-                        if not results:
-                            return "No results found."
-                        return json.dumps(results, indent=2)
-                except Exception as e:
-                    return f"Error performing search: {str(e)}"
-
-
-            async def update_hotel_record(ctx: RunContext[None], args: HotelUpdateArgs) -> str:
-                """
-                Updates the record for a specific hotel in the consolidated file.
-                """
-                hotel_id = args.hotel_id
-                field_name = args.field_name
-                value = args.value
-                justification = args.justification
-
-                if not os.path.exists(self.consolidated_file):
-                    return "Error: Consolidated hotel file not found."
-                
-                try:
-                    with open(self.consolidated_file, 'r') as hf:
-                        all_records = json.load(hf)
-                    
-                    if hotel_id not in all_records:
-                        return f"Error: Hotel ID {hotel_id} not found in records."
-                    
-                    all_records[hotel_id][field_name] = value
-                    all_records[hotel_id]["justification"] = justification
-                    
-                    with open(self.consolidated_file, 'w') as hf:
-                        json.dump(all_records, hf, indent=2)
-                    return f"Successfully updated record for {hotel_id}."
-                except Exception as e:
-                    return f"Error updating record: {str(e)}"
-
-            # 3. Re-initialize Agent with Tool
-            self.agent = Agent(
-                self.model, 
-                system_prompt=self.system_prompt,
-                tools=[update_hotel_record, web_search]
-            )
+            # Reloading the same context reuses the agent built for it
+            self.agent = self._get_agent(self.system_prompt)
             print(f"Loaded context from {file_path} and initialized consolidated records in '{self.consolidated_file}'.")
         except Exception as e:
             print(f"Error loading JSON context: {e}")
 
+    def _message_history(self) -> List[ModelMessage]:
+        messages: List[ModelMessage] = []
+        if self._evicted:
+            # The turn that carried the system prompt has been evicted (pydantic-ai only injects
+            # it into an empty history), so restate it, with the summary when one exists
+            parts = [SystemPromptPart(self.system_prompt)]
+            if self._summary:
+                parts.append(SystemPromptPart(f"Summary of the earlier conversation:\n{self._summary}"))
+            messages.append(ModelRequest(parts=parts))
+        for turn in self.history:
+            messages.extend(turn)
+        return messages
+
+    async def _compact_history(self):
+        """Fold the oldest turns into the running summary so per-turn cost stays bounded"""
+        evicted = [self.history.popleft() for _ in range(min(SUMMARIZE_BATCH, len(self.history)))]
+        self._evicted = True
+        lines = []
+        for message in (m for turn in evicted for m in turn):
+            for part in message.parts:
+                if part.part_kind == "user-prompt" and isinstance(part.content, str):
+                    lines.append(f"User: {part.content}")
+                elif part.part_kind == "text":
+                    lines.append(f"Assistant: {part.content}")
+        prompt = "\n".join(lines)
+        if self._summary:
+            prompt = f"Summary so far:\n{self._summary}\n\nNew messages:\n{prompt}"
+        try:
+            result = await self._summary_agent.run(prompt)
+            self._summary = result.output
+        except Exception as e:
+            print(f"Warning: Could not summarize conversation history: {e}")
+
     async def chat(self, user_input: str) -> str:
-        # Run the agent with the current history
-        result = await self.agent.run(user_input, message_history=self.history)
+        # Run the agent with the current (bounded) history
+        result = await self.agent.run(user_input, message_history=self._message_history(), deps=self)
         
-        # Update history with the new messages (user input + model response)
+        # Store the new messages (user input + model response) as one turn
         # result.new_messages() returns the messages added during this run
-        self.history.extend(result.new_messages())
+        if len(self.history) == self.history.maxlen:
+            await self._compact_history()
+        self.history.append(result.new_messages())
         
         return result.output
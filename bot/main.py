@@ -12,7 +12,7 @@ async def main():
         print("ChatBot initialized. Type 'exit' or 'quit' to stop.")
         print("----------------------------------------------------")
         json_path = "/Users/shaamsarath/Devstudio/projects/page1/data/data.json"
-        bot.load_json_context(json_path)
+        await bot.load_json_context(json_path)
         
     except ValueError as e:
         print(f"Error: {e}")
@@ -20,7 +20,8 @@ async def main():
 
     while True:
         try:
-            user_input = input("You: ")
+            # Read in a worker thread so the background flusher keeps running while we wait
+            user_input = await asyncio.to_thread(input, "You: ")
             if user_input.lower() in ('exit', 'quit'):
                 print("Goodbye!")
                 break
@@ -34,5 +35,7 @@ async def main():
         except Exception as e:
             print(f"An error occurred: {e}")
 
+    await bot.aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,18 +1,75 @@
 from fastapi import FastAPI, HTTPException, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from typing import List, Optional
 from datetime import date
+from contextlib import asynccontextmanager
+import logging
+import logging.handlers
 import os
+import queue
+import httpx
 
-from models.hotel import HotelSearchRequest, HotelSearchResponse, HotelDetails
+from pydantic import TypeAdapter
+
+from models.hotel import (
+    HotelSearchRequest, HotelSearchResponse, HotelDetails, HotelSummary,
+    HotelImage, HotelPrice, RoomType, RoomFacility
+)
 from models.booking import BookingRequest, BookingResponse, PaymentRequest, PaymentResponse
 from services.amadeus_service import AmadeusService
 from services.booking_service import BookingService
 from services.google_places_service import GooglePlacesService
 
-app = FastAPI(title="Travel Booking API")
+# Log calls only enqueue the record; a listener thread does the actual stream writes
+# so request handlers never block the event loop on stdout/stderr
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+# (basicConfig formats on the QueueHandler side, so the stream handler writes the message as-is)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
+)
+logger = logging.getLogger(__name__)
+
+# Services are created in lifespan (i.e. after uvicorn forks its workers) so each
+# worker process gets its own HTTP pool and MongoDB clients
+http_client: Optional[httpx.AsyncClient] = None
+amadeus_service: Optional[AmadeusService] = None
+booking_service: Optional[BookingService] = None
+google_places_service: Optional[GooglePlacesService] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client, amadeus_service, booking_service, google_places_service
+    
+    _log_listener.start()
+    
+    # One pooled HTTP client shared by all outbound API integrations (Amadeus, Google Places).
+    # HTTP/2 lets concurrent requests share a connection; HTTP2_ENABLED=false falls back to HTTP/1.1
+    http_client = httpx.AsyncClient(
+        http2=os.getenv("HTTP2_ENABLED", "true").lower() == "true",
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        timeout=30.0
+    )
+    amadeus_service = AmadeusService(http_client=http_client)
+    booking_service = BookingService()
+    google_places_service = GooglePlacesService(http_client=http_client)
+    
+    yield
+    
+    await amadeus_service.aclose()
+    await google_places_service.aclose()
+    await booking_service.repository.aclose()
+    await http_client.aclose()
+    
+    # Flush any queued log records before the worker exits
+    _log_listener.stop()
+
+
+app = FastAPI(title="Travel Booking API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -28,10 +85,8 @@ static_dir = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# Initialize services
-amadeus_service = AmadeusService()
-booking_service = BookingService()
-google_places_service = GooglePlacesService()
+# Built once at import so the validator schema is compiled a single time
+HOTEL_SUMMARY_LIST_ADAPTER = TypeAdapter(List[HotelSummary])
 
 
 @app.get("/")
@@ -77,35 +132,26 @@ async def search_hotels(request: HotelSearchRequest):
             check_out=request.check_out,
             adults=request.travelers
         )
-
-        import json
-        print("================================================")
-        print("hotels_data (first 3 items)")
-        print("================================================")
-        print(json.dumps(hotels_data[:3], indent=4))
-        # Convert to response model
-        from models.hotel import HotelSummary, HotelImage, HotelPrice
+        logger.debug("hotels_data sample: %s", hotels_data[:3])
         
-        hotel_summaries = []
-        for hotel_data in hotels_data:
-            images = [HotelImage(**img) for img in hotel_data.get("images", [])]
-            price = HotelPrice(
-                daily=hotel_data.get("daily_price"),
-                total=hotel_data.get("total_price"),
-                currency=hotel_data.get("currency", "USD")
-            )
-            
-            hotel_summary = HotelSummary(
-                hotel_id=hotel_data.get("hotel_id"),
-                name=hotel_data.get("name"),
-                images=images,
-                price=price,
-                address=hotel_data.get("address"),
-                rating=hotel_data.get("rating"),
-                latitude=hotel_data.get("latitude"),
-                longitude=hotel_data.get("longitude")
-            )
-            hotel_summaries.append(hotel_summary)
+        # Convert to response model in one validation pass
+        hotel_summaries = HOTEL_SUMMARY_LIST_ADAPTER.validate_python([
+            {
+                "hotel_id": hotel_data.get("hotel_id"),
+                "name": hotel_data.get("name"),
+                "images": hotel_data.get("images", []),
+                "price": {
+                    "daily": hotel_data.get("daily_price"),
+                    "total": hotel_data.get("total_price"),
+                    "currency": hotel_data.get("currency", "USD")
+                },
+                "address": hotel_data.get("address"),
+                "rating": hotel_data.get("rating"),
+                "latitude": hotel_data.get("latitude"),
+                "longitude": hotel_data.get("longitude")
+            }
+            for hotel_data in hotels_data
+        ])
         
         return HotelSearchResponse(
             hotels=hotel_summaries,
@@ -135,9 +181,11 @@ async def get_hotel_details(
         if not hotel_data:
             raise HTTPException(status_code=404, detail="Hotel not found")
         
-        # Convert to response model
-        from models.hotel import HotelImage, HotelPrice, RoomType, RoomFacility
+        # Remember the name so a booking for this hotel doesn't need another details lookup
+        if hotel_data.get("name"):
+            booking_service.hotel_names[hotel_id] = hotel_data["name"]
         
+        # Convert to response model
         images = [HotelImage(**img) for img in hotel_data.get("images", [])]
         
         rooms = []
@@ -214,10 +262,10 @@ async def get_google_places_data(
                 content={"message": "Hotel not found in Google Places"}
             )
         
-        # Convert photo references to URLs
+        # Convert photo references to URLs (pure string formatting, no I/O)
         photos = []
         for photo_ref in place_data.get("photo_references", []):
-            photo_url = await google_places_service.get_photo_url(
+            photo_url = google_places_service.get_photo_url(
                 photo_ref.get("photo_reference"),
                 max_width=800,
                 max_height=600,
@@ -258,7 +306,7 @@ async def create_booking(booking_request: BookingRequest):
             )
             hotel_name = hotel_data.get("name", "Unknown Hotel") if hotel_data else "Unknown Hotel"
         
-        booking = booking_service.create_booking(booking_request, hotel_name)
+        booking = await booking_service.create_booking(booking_request, hotel_name)
         return booking
         
     except Exception as e:
@@ -272,17 +320,30 @@ async def process_payment(booking_id: str, payment_request: PaymentRequest):
         if payment_request.booking_id != booking_id:
             raise HTTPException(status_code=400, detail="Booking ID mismatch")
         
-        result = booking_service.process_payment(booking_id)
+        result = await booking_service.process_payment(booking_id)
         return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing payment: {str(e)}")
 
 
+@app.get("/api/bookings")
+async def list_bookings():
+    """Stream all bookings as NDJSON (admin/debugging; enable with BOOKINGS_ADMIN_ENABLED=true)"""
+    if os.getenv("BOOKINGS_ADMIN_ENABLED", "false").lower() != "true":
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    async def ndjson_lines():
+        async for booking in booking_service.iter_bookings():
+            yield booking.model_dump_json() + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
 @app.get("/api/bookings/{booking_id}", response_model=BookingResponse)
 async def get_booking(booking_id: str):
     """Get booking details by ID"""
-    booking = booking_service.get_booking(booking_id)
+    booking = await booking_service.get_booking(booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     return booking
@@ -290,5 +351,13 @@ async def get_booking(booking_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Bookings live in MongoDB, so workers can scale to the available cores
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools"
+    )
 
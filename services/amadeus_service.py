@@ -1,17 +1,70 @@
 import os
+import asyncio
+import functools
+import logging
 import httpx
-from typing import Optional, List, Dict, Any
+import orjson
+from cachetools import TTLCache
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import date, timedelta
 from dotenv import load_dotenv
 from services.cache_service import AmadeusCacheService
+from services.single_flight import single_flight
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Simple mapping for common destinations to IATA city codes
+_CITY_MAPPING: Dict[str, str] = {
+    "new york": "NYC",
+    "nyc": "NYC",
+    "new york city": "NYC",
+    "paris": "PAR",
+    "london": "LON",
+    "tokyo": "TYO",
+    "los angeles": "LAX",
+    "lax": "LAX",
+    "san francisco": "SFO",
+    "sfo": "SFO",
+    "chicago": "CHI",
+    "miami": "MIA",
+    "dubai": "DXB",
+    "singapore": "SIN",
+    "bangkok": "BKK",
+    "sydney": "SYD",
+    "rome": "ROM",
+    "barcelona": "BCN",
+    "amsterdam": "AMS",
+    "berlin": "BER",
+    "madrid": "MAD"
+}
+
+
+def _format_address(addr: Dict[str, Any]) -> str:
+    """Flatten an Amadeus address object into "line 1, line 2, City, CC" """
+    parts = list(addr.get("lines") or [])
+    parts.append(addr.get("cityName"))
+    parts.append(addr.get("countryCode"))
+    return ", ".join(part for part in parts if part)
+
 
 class AmadeusService:
     """Service for interacting with Amadeus Self Service API"""
     
-    def __init__(self):
+    TOKEN_ENDPOINT = "/v1/security/oauth2/token"
+    # Cache namespace for single-hotel offers (shares the /v3/shopping/hotel-offers TTL)
+    OFFER_CACHE_ENDPOINT = "/v3/shopping/hotel-offers/by-hotel"
+    # Cached for requested hotels that came back without offers, so they aren't re-queried
+    NO_OFFERS: Dict[str, Any] = {"offers": []}
+    # Responses larger than this are not worth a MongoDB write
+    MAX_CACHED_PAYLOAD_BYTES = 256 * 1024
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: Shared pooled client to reuse across services; a private one is created if omitted
+        """
         self.client_id = os.getenv("AMADEUS_CLIENT_ID")
         self.client_secret = os.getenv("AMADEUS_CLIENT_SECRET")
         self.env = os.getenv("AMADEUS_ENV", "test")
@@ -24,15 +77,54 @@ class AmadeusService:
         
         self.access_token: Optional[str] = None
         self.token_expires_at: Optional[float] = None
+        self._token_task: Optional[asyncio.Future] = None
+        
+        # Requests currently in flight, keyed by (endpoint, sorted params)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        
+        # Bounded in-process cache for hotels by city code; MongoDB backs it via _make_request
+        self.hotel_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+        
+        # Upper bound on concurrent offer requests (Amadeus test env allows ~10 TPS)
+        self.max_concurrent_requests = int(os.getenv("AMADEUS_MAX_CONCURRENCY", "10"))
         
-        # Cache for hotels by city code
-        self.hotel_cache: Dict[str, List[Dict[str, Any]]] = {}
+        # Parsed hotel details keyed by (hotel_id, check_in, check_out, adults)
+        self.hotel_details_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
         
         # Initialize MongoDB cache service
         self.cache_service = AmadeusCacheService()
         
+        # Long-lived client so connections (and TLS sessions) are reused across requests.
+        # A shared client is borrowed; otherwise one is created lazily on first use and owned here.
+        self._http: Optional[httpx.AsyncClient] = http_client
+        self._owns_http = http_client is None
+    
+    async def _client(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client, creating it on first use"""
+        if self._http is None:
+            # HTTP/2 multiplexes the concurrent offer batches over one connection;
+            # set HTTP2_ENABLED=false to fall back to HTTP/1.1 if the h2 pool misbehaves
+            self._http = httpx.AsyncClient(
+                http2=os.getenv("HTTP2_ENABLED", "true").lower() == "true",
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=30.0),
+                timeout=httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0)
+            )
+        return self._http
+    
+    async def aclose(self):
+        """Close the HTTP client if this service created it (a shared client is closed by its owner)"""
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await self.cache_service.aclose()
+        
     async def _get_access_token(self) -> str:
-        """Get OAuth 2.0 access token using client credentials flow"""
+        """
+        Get OAuth 2.0 access token using client credentials flow
+        
+        The token is shared through the MongoDB cache so that other workers (and restarts)
+        reuse it instead of re-authenticating.
+        """
         # Check if we have a valid token
         import time
         if self.access_token and self.token_expires_at and time.time() < self.token_expires_at:
@@ -41,72 +133,118 @@ class AmadeusService:
         if not self.client_id or not self.client_secret:
             raise ValueError("Amadeus API credentials not configured. Set AMADEUS_CLIENT_ID and AMADEUS_CLIENT_SECRET in .env")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/v1/security/oauth2/token",
-                data={
-                    "grant_type": "client_credentials",
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            self.access_token = data["access_token"]
-            # Set expiration time (subtract 60 seconds for safety)
-            expires_in = data.get("expires_in", 1800)
-            self.token_expires_at = time.time() + expires_in - 60
+        # Concurrent callers share a single in-flight refresh
+        if self._token_task is None or self._token_task.done():
+            self._token_task = asyncio.ensure_future(self._refresh_access_token())
+        return await asyncio.shield(self._token_task)
+    
+    async def _refresh_access_token(self) -> str:
+        """Load the token persisted by another worker, or fetch a new one from Amadeus"""
+        import time
+        
+        # Check for a token persisted by another process
+        token_params = {"client_id": self.client_id}
+        cached_token = await self.cache_service.get(self.TOKEN_ENDPOINT, token_params)
+        if cached_token and time.time() < cached_token.get("expires_at", 0):
+            self.access_token = cached_token["access_token"]
+            self.token_expires_at = cached_token["expires_at"]
             return self.access_token
+        
+        client = await self._client()
+        response = await client.post(
+            f"{self.base_url}{self.TOKEN_ENDPOINT}",
+            data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        self.access_token = data["access_token"]
+        # Set expiration time (subtract 60 seconds for safety)
+        expires_in = data.get("expires_in", 1800)
+        self.token_expires_at = time.time() + expires_in - 60
+        
+        # Persist for other workers; the Mongo TTL index drops it once it expires
+        await self.cache_service.set(
+            self.TOKEN_ENDPOINT,
+            token_params,
+            {"access_token": self.access_token, "expires_at": self.token_expires_at},
+            ttl_hours=(expires_in - 60) / 3600
+        )
+        return self.access_token
     
-    async def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def _make_request(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        cache: bool = True
+    ) -> Dict[str, Any]:
         """
         Make authenticated request to Amadeus API with MongoDB caching
         
+        Identical requests issued while one is already in flight wait for its result
+        instead of hitting the cache/API again.
+        
         Args:
             endpoint: API endpoint path (e.g., "/v1/reference-data/locations/hotels/by-city")
             params: Request parameters
+            cache: Whether to read/write the MongoDB cache for this response
             
         Returns:
             API response data
         """
+        key = (endpoint, tuple(sorted((params or {}).items())), cache)
+        return await single_flight(self._inflight, key, lambda: self._fetch(endpoint, params, cache))
+    
+    async def _fetch(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        cache: bool = True
+    ) -> Dict[str, Any]:
+        """Serve a request from the MongoDB cache, falling back to the Amadeus API"""
         # Check cache first (if enabled and available)
-        cached_response = await self.cache_service.get(endpoint, params)
-        if cached_response is not None:
-            print(f"Cache HIT for endpoint: {endpoint} with params: {params}")
-            return cached_response
-        
-        # Cache miss - make API request
-        print(f"Cache MISS for endpoint: {endpoint}, making API request...")
+        if cache:
+            cached_response = await self.cache_service.get(endpoint, params)
+            if cached_response is not None:
+                logger.debug("Cache HIT for endpoint: %s with params: %s", endpoint, params)
+                return cached_response
+            
+            # Cache miss - make API request
+            logger.debug("Cache MISS for endpoint: %s, making API request...", endpoint)
         token = await self._get_access_token()
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{self.base_url}{endpoint}",
-                params=params,
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Accept": "application/json"
-                }
+        client = await self._client()
+        response = await client.get(
+            f"{self.base_url}{endpoint}",
+            params=params,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/json"
+            }
+        )
+        data = orjson.loads(response.content)
+        
+        # Check for errors in the JSON response body
+        if "errors" in data and len(data["errors"]) > 0:
+            error = data["errors"][0]
+            status_code = error.get("status", 500)
+            detail = error.get("detail", "Unknown error")
+            raise httpx.HTTPStatusError(
+                f"Amadeus API error: {detail}",
+                request=response.request,
+                response=response
             )
-            data = response.json()
-            
-            # Check for errors in the JSON response body
-            if "errors" in data and len(data["errors"]) > 0:
-                error = data["errors"][0]
-                status_code = error.get("status", 500)
-                detail = error.get("detail", "Unknown error")
-                raise httpx.HTTPStatusError(
-                    f"Amadeus API error: {detail}",
-                    request=response.request,
-                    response=response
-                )
-            
-            # Store successful response in cache
+        
+        # Store successful response in cache, skipping empty results and oversized payloads
+        if cache and data.get("data") and len(response.content) < self.MAX_CACHED_PAYLOAD_BYTES:
             await self.cache_service.set(endpoint, params, data)
-            
-            return data
-    
+        
+        return data
+
     async def _fetch_hotels_by_city(self, city_code: str) -> List[Dict[str, Any]]:
         """
         Fetch hotels in a city using Hotel List API
@@ -142,7 +280,7 @@ class AmadeusService:
             return hotels
             
         except Exception as e:
-            print(f"Error fetching hotels by city: {e}")
+            logger.warning("Error fetching hotels by city: %s", e)
             return []
     
     async def _fetch_hotel_offers(
@@ -165,32 +303,74 @@ class AmadeusService:
         Returns:
             Dictionary mapping hotel_id to hotel data with offers
         """
+        check_in_str = check_in.isoformat()
+        check_out_str = check_out.isoformat()
+        
+        def offer_cache_params(hotel_id: str) -> Dict[str, Any]:
+            return {"hotelId": hotel_id, "checkInDate": check_in_str, "checkOutDate": check_out_str, "adults": adults}
+        
+        # Offers are cached per hotel, so overlapping searches only re-fetch the hotels they miss
+        try:
+            cached_offers = await self.cache_service.get_many(
+                self.OFFER_CACHE_ENDPOINT,
+                [offer_cache_params(hotel_id) for hotel_id in hotel_ids]
+            )
+        except Exception as e:
+            # Cache trouble (e.g. MongoDB down) degrades to a full miss, not a failed search
+            logger.warning("Error reading cached hotel offers: %s", e)
+            cached_offers = [None] * len(hotel_ids)
+        # Hotels without availability are cached as an {"offers": []} sentinel: a hit, but not a result
+        all_hotels = {
+            hotel_id: offer
+            for hotel_id, offer in zip(hotel_ids, cached_offers)
+            if offer is not None and offer.get("offers")
+        }
+        missing_ids = [hotel_id for hotel_id, offer in zip(hotel_ids, cached_offers) if offer is None]
+        if len(missing_ids) < len(hotel_ids):
+            logger.debug("Offer cache hit for %d/%d hotels", len(hotel_ids) - len(missing_ids), len(hotel_ids))
+        
         # Amadeus API allows up to 10 hotel IDs per request
         batch_size = 10
-        all_hotels = {}
+        batches = [missing_ids[i:i + batch_size] for i in range(0, len(missing_ids), batch_size)]
         
-        for i in range(0, len(hotel_ids), batch_size):
-            batch = hotel_ids[i:i + batch_size]
-            
+        # Fire the batches concurrently, bounded to stay within the Amadeus rate limit
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        
+        async def fetch_batch(batch: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+            params = {
+                "hotelIds": ",".join(batch),
+                "checkInDate": check_in_str,
+                "checkOutDate": check_out_str,
+                "adults": adults
+            }
+            async with semaphore:
+                # The batch response is cached per hotel below instead of as a whole
+                return batch, await self._make_request("/v3/shopping/hotel-offers", params, cache=False)
+        
+        # Merge each batch as soon as it lands so parsing overlaps the remaining round-trips
+        for next_batch in asyncio.as_completed([fetch_batch(batch) for batch in batches]):
             try:
-                params = {
-                    "hotelIds": ",".join(batch),
-                    "checkInDate": check_in.isoformat(),
-                    "checkOutDate": check_out.isoformat(),
-                    "adults": adults
-                }
-                
-                data = await self._make_request("/v3/shopping/hotel-offers", params)
-                
-                if "data" in data:
-                    for hotel_data in data["data"]:
-                        hotel_id = hotel_data.get("hotel", {}).get("hotelId", "")
-                        if hotel_id:
-                            all_hotels[hotel_id] = hotel_data
-                            
+                batch, data = await next_batch
             except Exception as e:
-                print(f"Error fetching offers for hotel batch: {e}")
+                logger.warning("Error fetching offers for hotel batch: %s", e)
                 continue
+            
+            fetched = {}
+            if "data" in data:
+                for hotel_data in data["data"]:
+                    hotel_id = hotel_data.get("hotel", {}).get("hotelId", "")
+                    if hotel_id:
+                        fetched[hotel_id] = hotel_data
+            
+            all_hotels.update(fetched)
+            try:
+                await self.cache_service.set_many(
+                    self.OFFER_CACHE_ENDPOINT,
+                    [(offer_cache_params(hotel_id), fetched.get(hotel_id, self.NO_OFFERS)) for hotel_id in batch]
+                )
+            except Exception as e:
+                # Keep draining the remaining batches; the offers are still returned uncached
+                logger.warning("Error caching hotel offers: %s", e)
         
         return all_hotels
     
@@ -223,12 +403,12 @@ class AmadeusService:
             
             # Step 1: Get hotels in city (use cache if available)
             if city_code not in self.hotel_cache:
-                print(f"Fetching hotels for city: {city_code}")
+                logger.debug("Fetching hotels for city: %s", city_code)
                 hotels_list = await self._fetch_hotels_by_city(city_code)
                 self.hotel_cache[city_code] = hotels_list
-                print(f"Cached {len(hotels_list)} hotels for {city_code}")
+                logger.debug("Cached %d hotels for %s", len(hotels_list), city_code)
             else:
-                print(f"Using cached hotels for {city_code}")
+                logger.debug("Using cached hotels for %s", city_code)
                 hotels_list = self.hotel_cache[city_code]
             
             if not hotels_list:
@@ -237,37 +417,53 @@ class AmadeusService:
             # Step 2: Get hotel IDs and fetch offers
             hotel_ids = [hotel["hotel_id"] for hotel in hotels_list if hotel.get("hotel_id")]
             
-            print(f"Fetching offers for {len(hotel_ids)} hotels...")
+            logger.debug("Fetching offers for %d hotels...", len(hotel_ids))
             hotel_offers = await self._fetch_hotel_offers(hotel_ids, check_in, check_out, adults)
-            print(f"found {len(hotel_offers)} offers")
+            logger.debug("Found %d offers", len(hotel_offers))
             
-            # Step 3: Combine hotel list data with offers
-            # Only include hotels that have offers available
-            hotels = []
-            for hotel_info in hotels_list:
-                hotel_id = hotel_info["hotel_id"]
-                
-                # Only build HotelDetails if we have offers for this hotel
-                if hotel_id in hotel_offers:
-                    hotel = self._parse_hotel_data(
-                        hotel_offers[hotel_id], 
-                        check_in, 
-                        check_out, 
-                        nights,
-                        hotel_list_info=hotel_info  # Pass hotel list data for address/geoCode
-                    )
-                    if hotel:
-                        hotels.append(hotel)
-                # Skip hotels without offers - continue to next hotel
-            
-            print(f"Returning {len(hotels)} hotels with offers")
+            # Step 3: Combine hotel list data with offers (in a worker thread to keep the loop free)
+            hotels = await asyncio.to_thread(
+                self._bulk_parse, hotels_list, hotel_offers, check_in, check_out, nights
+            )
+            
+            logger.debug("Returning %d hotels with offers", len(hotels))
             return hotels
             
         except Exception as e:
             raise Exception(f"Error searching hotels: {str(e)}")
     
+    @staticmethod
+    def _bulk_parse(
+        hotels_list: List[Dict[str, Any]],
+        hotel_offers: Dict[str, Dict[str, Any]],
+        check_in: date,
+        check_out: date,
+        nights: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Parse every hotel that has offers (pure function, safe to run off the event loop)
+        
+        Only hotels with offers available are included; hotels without offers are skipped.
+        """
+        parse_hotel = AmadeusService._parse_hotel_data
+        return [
+            hotel
+            for hotel in (
+                parse_hotel(
+                    hotel_offers[hotel_info["hotel_id"]],
+                    check_in,
+                    check_out,
+                    nights,
+                    hotel_list_info=hotel_info  # Pass hotel list data for address/geoCode
+                )
+                for hotel_info in hotels_list
+                if hotel_info["hotel_id"] in hotel_offers
+            )
+            if hotel
+        ]
+    
+    @staticmethod
     def _parse_hotel_data(
-        self, 
         hotel_data: Dict[str, Any], 
         check_in: date, 
         check_out: date, 
@@ -304,12 +500,7 @@ class AmadeusService:
                 # Use address from hotel list API (only source)
                 addr = hotel_list_info["address"]
                 if isinstance(addr, dict):
-                    address_parts = [
-                        addr.get("lines", []),
-                        addr.get("cityName", ""),
-                        addr.get("countryCode", "")
-                    ]
-                    address = ", ".join(filter(None, [item for sublist in address_parts for item in (sublist if isinstance(sublist, list) else [sublist])]))
+                    address = _format_address(addr)
             
             # Get price from offers
             daily_price = None
@@ -368,7 +559,7 @@ class AmadeusService:
                 "raw_data": hotel_data  # Store raw data for details page
             }
         except Exception as e:
-            print(f"Error parsing hotel data: {e}")
+            logger.warning("Error parsing hotel data: %s", e)
             return None
     
     def _parse_hotel_from_list(
@@ -384,15 +575,7 @@ class AmadeusService:
             name = hotel_info.get("name", "Unknown Hotel")
             
             # Get address
-            address = ""
-            addr = hotel_info.get("address", {})
-            if addr:
-                address_parts = [
-                    addr.get("lines", []),
-                    addr.get("cityName", ""),
-                    addr.get("countryCode", "")
-                ]
-                address = ", ".join(filter(None, [item for sublist in address_parts for item in (sublist if isinstance(sublist, list) else [sublist])]))
+            address = _format_address(hotel_info.get("address") or {})
             
             # No pricing available without offers
             return {
@@ -407,7 +590,7 @@ class AmadeusService:
                 "raw_data": hotel_info.get("raw_data", {})
             }
         except Exception as e:
-            print(f"Error parsing hotel from list: {e}")
+            logger.warning("Error parsing hotel from list: %s", e)
             return None
     
     async def get_hotel_details(
@@ -436,6 +619,11 @@ class AmadeusService:
                 check_in = check_in or date.today() + timedelta(days=30)
                 check_out = check_out or check_in + timedelta(days=1)
             
+            details_key = (hotel_id, check_in, check_out, adults)
+            cached_details = self.hotel_details_cache.get(details_key)
+            if cached_details is not None:
+                return cached_details
+            
             # Use Hotel Details API - requires dates for hotel-offers endpoint
             params = {
                 "hotelIds": hotel_id,
@@ -448,7 +636,9 @@ class AmadeusService:
             
             if "data" in data and len(data["data"]) > 0:
                 hotel_data = data["data"][0]
-                return self._parse_hotel_details(hotel_data)
+                hotel_details = self._parse_hotel_details(hotel_data)
+                self.hotel_details_cache[details_key] = hotel_details
+                return hotel_details
             
             return None
             
@@ -469,73 +659,46 @@ class AmadeusService:
         description = hotel_info.get("description", {}).get("text", "")
         
         # Address
-        address = ""
-        if "address" in hotel_info:
-            addr = hotel_info["address"]
-            address_parts = [
-                addr.get("lines", []),
-                addr.get("cityName", ""),
-                addr.get("countryCode", "")
-            ]
-            address = ", ".join(filter(None, [item for sublist in address_parts for item in (sublist if isinstance(sublist, list) else [sublist])]))
+        address = _format_address(hotel_info.get("address") or {})
         
         # Images
-        images = []
-        if "media" in hotel_info:
-            for media in hotel_info["media"]:
-                images.append({
-                    "url": media.get("uri", ""),
-                    "category": media.get("category", "")
-                })
-        
-        # Rooms and facilities from offers
+        images = [
+            {"url": media.get("uri", ""), "category": media.get("category", "")}
+            for media in hotel_info.get("media") or []
+        ]
+        
+        # Rooms from offers
+        offers = hotel_data.get("offers") or []
         rooms = []
-        facilities = set()
-        
-        if "offers" in hotel_data:
-            for offer in hotel_data["offers"]:
-                room_type = offer.get("room", {}).get("type", "Standard Room")
-                room_description = offer.get("room", {}).get("description", {}).get("text", "")
-                
-                # Room facilities
-                room_facilities = []
-                if "room" in offer and "amenities" in offer["room"]:
-                    for amenity in offer["room"]["amenities"]:
-                        facilities.add(amenity.get("description", ""))
-                        room_facilities.append({
-                            "name": amenity.get("description", ""),
-                            "description": amenity.get("description", "")
-                        })
-                
-                # Price
-                price_info = offer.get("price", {})
-                total_price = float(price_info.get("total", 0))
-                currency = price_info.get("currency", "USD")
-                
-                rooms.append({
-                    "type": room_type,
-                    "description": room_description,
-                    "facilities": room_facilities,
-                    "price": {
-                        "total": total_price,
-                        "currency": currency
-                    },
-                    "max_occupancy": offer.get("guests", {}).get("adults", 2)
-                })
-        
-        # Hotel facilities
-        hotel_facilities_list = []
-        if "amenities" in hotel_info:
-            for amenity in hotel_info["amenities"]:
-                facilities.add(amenity.get("description", ""))
-                hotel_facilities_list.append(amenity.get("description", ""))
+        for offer in offers:
+            room = offer.get("room", {})
+            price_info = offer.get("price", {})
+            rooms.append({
+                "type": room.get("type", "Standard Room"),
+                "description": room.get("description", {}).get("text", ""),
+                "facilities": [
+                    {"name": amenity.get("description", ""), "description": amenity.get("description", "")}
+                    for amenity in room.get("amenities") or []
+                ],
+                "price": {
+                    "total": float(price_info.get("total", 0)),
+                    "currency": price_info.get("currency", "USD")
+                },
+                "max_occupancy": offer.get("guests", {}).get("adults", 2)
+            })
+        
+        # Facilities: every room amenity plus the hotel's own amenities
+        facilities = {
+            facility["name"] for room in rooms for facility in room["facilities"]
+        }
+        facilities.update(amenity.get("description", "") for amenity in hotel_info.get("amenities") or [])
         
         # Price (from first offer)
         daily_price = None
         total_price = None
         currency = "USD"
-        if "offers" in hotel_data and len(hotel_data["offers"]) > 0:
-            price_info = hotel_data["offers"][0].get("price", {})
+        if offers:
+            price_info = offers[0].get("price", {})
             total_price = float(price_info.get("total", 0))
             currency = price_info.get("currency", "USD")
             daily_price = total_price  # This would need check-in/out dates to calculate properly
@@ -565,37 +728,12 @@ class AmadeusService:
             "currency": currency
         }
     
-    def get_city_code(self, destination: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def get_city_code(destination: str) -> str:
         """
         Convert destination name to IATA city code
         This is a simplified version - in production, you'd use Amadeus Location API
         """
-        # Simple mapping for common destinations
-        city_mapping = {
-            "new york": "NYC",
-            "nyc": "NYC",
-            "new york city": "NYC",
-            "paris": "PAR",
-            "london": "LON",
-            "tokyo": "TYO",
-            "tokyo": "TYO",
-            "los angeles": "LAX",
-            "lax": "LAX",
-            "san francisco": "SFO",
-            "sfo": "SFO",
-            "chicago": "CHI",
-            "miami": "MIA",
-            "dubai": "DXB",
-            "singapore": "SIN",
-            "bangkok": "BKK",
-            "sydney": "SYD",
-            "rome": "ROM",
-            "barcelona": "BCN",
-            "amsterdam": "AMS",
-            "berlin": "BER",
-            "madrid": "MAD"
-        }
-        
         destination_lower = destination.lower().strip()
-        return city_mapping.get(destination_lower, destination_lower.upper()[:3])
-
+        return _CITY_MAPPING.get(destination_lower, destination_lower.upper()[:3])
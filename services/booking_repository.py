@@ -0,0 +1,147 @@
+import os
+from dataclasses import dataclass, asdict
+from datetime import date
+from typing import Dict, Optional, Any, AsyncIterator
+from pymongo import AsyncMongoClient
+from dotenv import load_dotenv
+from models.booking import BookingStatus
+
+load_dotenv()
+
+
+@dataclass(slots=True)
+class BookingRecord:
+    """Stored booking row (slotted to keep per-booking memory small)"""
+    booking_id: str
+    hotel_id: str
+    hotel_name: str
+    check_in: date
+    check_out: date
+    travelers: int
+    guest_info: Dict
+    status: BookingStatus
+    total_price: float
+    currency: str
+    room_type: Optional[str]
+
+
+class InMemoryBookingsRepository:
+    """Process-local booking storage (single worker / development only)"""
+    
+    def __init__(self):
+        # booking_id -> booking record
+        self.bookings: Dict[str, BookingRecord] = {}
+    
+    async def insert(self, booking: BookingRecord) -> None:
+        """Store a new booking"""
+        self.bookings[booking.booking_id] = booking
+    
+    async def get(self, booking_id: str) -> Optional[BookingRecord]:
+        """Get booking by ID"""
+        return self.bookings.get(booking_id)
+    
+    async def mark_paid(self, booking_id: str) -> bool:
+        """
+        Flip a booking to PAID unless it already is
+        
+        Returns:
+            True if this call changed the status, False if the booking is missing or already paid
+        """
+        # No await between the check and the write, so this is atomic on the event loop
+        booking = self.bookings.get(booking_id)
+        if booking is None or booking.status == BookingStatus.PAID:
+            return False
+        booking.status = BookingStatus.PAID
+        return True
+    
+    async def iter_all(self) -> AsyncIterator[BookingRecord]:
+        """Iterate over all bookings"""
+        # Snapshot the values so inserts during iteration don't break the loop
+        for booking in list(self.bookings.values()):
+            yield booking
+    
+    async def aclose(self):
+        """Nothing to release for in-memory storage"""
+
+
+class MongoBookingsRepository:
+    """MongoDB-backed booking storage shared by all worker processes"""
+    
+    def __init__(self):
+        mongo_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+        db_name = os.getenv("MONGODB_BOOKINGS_DB_NAME", "travel_bookings")
+        
+        # The async client connects lazily on first operation
+        self.client = AsyncMongoClient(
+            mongo_url,
+            serverSelectionTimeoutMS=2000,
+            connectTimeoutMS=2000
+        )
+        self.collection = self.client[db_name]["bookings"]
+        self._indexes_ready = False
+    
+    async def _collection(self):
+        """Return the bookings collection, creating its indexes on first use"""
+        if not self._indexes_ready:
+            await self.collection.create_index("booking_id", unique=True)
+            self._indexes_ready = True
+        return self.collection
+    
+    def _to_document(self, booking: BookingRecord) -> Dict[str, Any]:
+        """Convert a booking record to a BSON-friendly document (dates as ISO strings)"""
+        doc = asdict(booking)
+        doc["check_in"] = booking.check_in.isoformat()
+        doc["check_out"] = booking.check_out.isoformat()
+        doc["status"] = BookingStatus(booking.status).value
+        return doc
+    
+    def _from_document(self, doc: Dict[str, Any]) -> BookingRecord:
+        """Rebuild a booking record from a stored document"""
+        doc["check_in"] = date.fromisoformat(doc["check_in"])
+        doc["check_out"] = date.fromisoformat(doc["check_out"])
+        doc["status"] = BookingStatus(doc["status"])
+        return BookingRecord(**doc)
+    
+    async def insert(self, booking: BookingRecord) -> None:
+        """Store a new booking"""
+        collection = await self._collection()
+        await collection.insert_one(self._to_document(booking))
+    
+    async def get(self, booking_id: str) -> Optional[BookingRecord]:
+        """Get booking by ID (uses the unique booking_id index)"""
+        collection = await self._collection()
+        doc = await collection.find_one({"booking_id": booking_id}, projection={"_id": 0})
+        return self._from_document(doc) if doc else None
+    
+    async def mark_paid(self, booking_id: str) -> bool:
+        """
+        Flip a booking to PAID unless it already is, as a single conditional update
+        
+        Returns:
+            True if this call changed the status, False if the booking is missing or already paid
+        """
+        collection = await self._collection()
+        updated = await collection.find_one_and_update(
+            {"booking_id": booking_id, "status": {"$ne": BookingStatus.PAID.value}},
+            {"$set": {"status": BookingStatus.PAID.value}},
+            projection={"_id": 1}
+        )
+        return updated is not None
+    
+    async def iter_all(self) -> AsyncIterator[BookingRecord]:
+        """Iterate over all bookings, fetched from MongoDB in batches of 200"""
+        collection = await self._collection()
+        async for doc in collection.find({}, projection={"_id": 0}, batch_size=200):
+            yield self._from_document(doc)
+    
+    async def aclose(self):
+        """Close the MongoDB client"""
+        await self.client.close()
+
+
+def create_bookings_repository():
+    """Build the booking store selected by BOOKINGS_STORE ("mongo" by default, or "memory")"""
+    store = os.getenv("BOOKINGS_STORE", "mongo").lower()
+    if store == "memory":
+        return InMemoryBookingsRepository()
+    return MongoBookingsRepository()
@@ -1,19 +1,34 @@
 import uuid
-from typing import Dict, Optional, List
-from datetime import date
-from models.booking import BookingRequest, BookingResponse, BookingStatus, PaymentResponse
+from typing import Dict, Optional, AsyncIterator
+from models.booking import BookingRequest, BookingResponse, BookingStatus, GuestInfo, PaymentResponse
+from services.booking_repository import BookingRecord, create_bookings_repository
+
+
+def _to_response(booking: BookingRecord) -> BookingResponse:
+    """
+    Build a BookingResponse without re-running validation
+    
+    Records are only ever created from an already validated BookingRequest, so the
+    fields are known-good; building from the current record keeps the status fresh.
+    """
+    fields = {name: getattr(booking, name) for name in BookingRecord.__slots__}
+    fields["guest_info"] = GuestInfo.model_construct(**booking.guest_info)
+    return BookingResponse.model_construct(**fields)
 
 
 class BookingService:
-    """Service for managing bookings with in-memory storage"""
+    """Service for managing bookings (stored in MongoDB, or in memory with BOOKINGS_STORE=memory)"""
     
-    def __init__(self):
-        # In-memory storage: booking_id -> booking_data
-        self.bookings: Dict[str, Dict] = {}
+    def __init__(self, repository=None):
+        """
+        Args:
+            repository: Booking store; defaults to the one selected by BOOKINGS_STORE
+        """
+        self.repository = repository or create_bookings_repository()
         # Hotel name cache for bookings
         self.hotel_names: Dict[str, str] = {}
     
-    def create_booking(self, booking_request: BookingRequest, hotel_name: str) -> BookingResponse:
+    async def create_booking(self, booking_request: BookingRequest, hotel_name: str) -> BookingResponse:
         """Create a new booking"""
         booking_id = str(uuid.uuid4())
         
@@ -21,63 +36,68 @@ class BookingService:
         nights = (booking_request.check_out - booking_request.check_in).days
         total_price = 150.0 * nights * booking_request.travelers  # Default price calculation
         
-        booking_data = {
-            "booking_id": booking_id,
-            "hotel_id": booking_request.hotel_id,
-            "hotel_name": hotel_name,
-            "check_in": booking_request.check_in,
-            "check_out": booking_request.check_out,
-            "travelers": booking_request.travelers,
-            "guest_info": booking_request.guest_info.dict(),
-            "status": BookingStatus.PENDING,
-            "total_price": total_price,
-            "currency": "USD",
-            "room_type": booking_request.room_type
-        }
+        booking = BookingRecord(
+            booking_id=booking_id,
+            hotel_id=booking_request.hotel_id,
+            hotel_name=hotel_name,
+            check_in=booking_request.check_in,
+            check_out=booking_request.check_out,
+            travelers=booking_request.travelers,
+            guest_info=booking_request.guest_info.model_dump(),
+            status=BookingStatus.PENDING,
+            total_price=total_price,
+            currency="USD",
+            room_type=booking_request.room_type
+        )
         
-        self.bookings[booking_id] = booking_data
+        await self.repository.insert(booking)
         self.hotel_names[booking_request.hotel_id] = hotel_name
         
-        return BookingResponse(**booking_data)
+        return _to_response(booking)
     
-    def get_booking(self, booking_id: str) -> Optional[BookingResponse]:
+    async def get_booking(self, booking_id: str) -> Optional[BookingResponse]:
         """Get booking by ID"""
-        booking_data = self.bookings.get(booking_id)
-        if booking_data:
-            return BookingResponse(**booking_data)
+        booking = await self.repository.get(booking_id)
+        if booking:
+            return _to_response(booking)
         return None
     
-    def process_payment(self, booking_id: str) -> PaymentResponse:
-        """Simulate payment processing"""
-        booking_data = self.bookings.get(booking_id)
+    async def process_payment(self, booking_id: str) -> PaymentResponse:
+        """
+        Simulate payment processing
         
-        if not booking_data:
-            return PaymentResponse(
-                success=False,
-                message="Booking not found",
-                booking_id=booking_id
-            )
-        
-        if booking_data["status"] == BookingStatus.PAID:
+        The PENDING -> PAID transition is a single conditional update, so concurrent
+        retries for the same booking can only charge it once.
+        """
+        # Simulate payment success
+        if await self.repository.mark_paid(booking_id):
+            transaction_id = f"TXN-{uuid.uuid4().hex[:12].upper()}"
             return PaymentResponse(
                 success=True,
-                message="Payment already processed",
+                message="Payment successful! Your booking is confirmed.",
                 booking_id=booking_id,
-                transaction_id=f"TXN-{booking_id[:8]}"
+                transaction_id=transaction_id
             )
         
-        # Simulate payment success
-        booking_data["status"] = BookingStatus.PAID
-        transaction_id = f"TXN-{uuid.uuid4().hex[:12].upper()}"
+        # Nothing changed: either the booking doesn't exist or it was already paid
+        booking = await self.repository.get(booking_id)
+        
+        if not booking:
+            return PaymentResponse(
+                success=False,
+                message="Booking not found",
+                booking_id=booking_id
+            )
         
         return PaymentResponse(
             success=True,
-            message="Payment successful! Your booking is confirmed.",
+            message="Payment already processed",
             booking_id=booking_id,
-            transaction_id=transaction_id
+            transaction_id=f"TXN-{booking_id[:8]}"
         )
     
-    def get_all_bookings(self) -> List[BookingResponse]:
-        """Get all bookings (for admin/debugging purposes)"""
-        return [BookingResponse(**booking) for booking in self.bookings.values()]
+    async def iter_bookings(self) -> AsyncIterator[BookingResponse]:
+        """Stream all bookings one at a time (for admin/debugging purposes)"""
+        async for booking in self.repository.iter_all():
+            yield _to_response(booking)
 
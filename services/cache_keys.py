@@ -0,0 +1,53 @@
+"""
+Cache-key derivation for the MongoDB API cache
+
+Plain module-level functions with concrete annotations and no dynamic features, so the
+module can be compiled ahead of time with mypyc (``mypyc services/cache_keys.py``).
+A compiled extension shadows this file on import; without one the Python source is used.
+"""
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional
+import orjson
+
+# Sorted, stable JSON for cache-key derivation
+KEY_JSON_OPTIONS: int = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+def normalize_params(params: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Normalize parameters for consistent cache keys
+    - Sort keys
+    - Convert values to strings for consistent hashing
+    - Remove None values
+    """
+    normalized: Dict[str, str] = {}
+    if not params:
+        return normalized
+    
+    for key, value in sorted(params.items()):
+        if value is not None:
+            # Convert to string for consistent hashing
+            if isinstance(value, (list, dict)):
+                normalized[key] = orjson.dumps(value, option=KEY_JSON_OPTIONS).decode()
+            else:
+                normalized[key] = str(value)
+    
+    return normalized
+
+
+def derive_cache_key(endpoint: str, params: Optional[Dict[str, Any]]) -> bytes:
+    """Raw BLAKE2b-256 digest of endpoint + normalized params"""
+    # Create a consistent byte representation
+    key_bytes = endpoint.encode() + b":" + orjson.dumps(normalize_params(params), option=KEY_JSON_OPTIONS)
+    
+    # No security requirement, just a fast deterministic digest
+    return blake2b(key_bytes, digest_size=32).digest()
+
+
+def derive_cache_keys(endpoint: str, params_list: List[Optional[Dict[str, Any]]]) -> List[bytes]:
+    """Same digests as derive_cache_key for many params of one endpoint (prefix encoded once)"""
+    prefix = endpoint.encode() + b":"
+    return [
+        blake2b(prefix + orjson.dumps(normalize_params(params), option=KEY_JSON_OPTIONS), digest_size=32).digest()
+        for params in params_list
+    ]
@@ -1,15 +1,51 @@
 import os
-import json
-import hashlib
+import logging
+import re
+import time
 import asyncio
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
-from pymongo import MongoClient
+import functools
+import orjson
+import zstandard
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timezone
+from bson import Binary
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from cachetools import LRUCache, TTLCache
+from pymongo import AsyncMongoClient, ReplaceOne
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from dotenv import load_dotenv
+from services.single_flight import single_flight
+from services.cache_keys import derive_cache_key, derive_cache_keys
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Cached payloads (repeated URLs, policy text) compress several times over with zstd
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+# Payload encoding recorded on each cache document, so the format can change without a migration
+PAYLOAD_CODEC = "zstd+orjson"
+
+# Derived cache keys, memoized by a hashable snapshot of (endpoint, params)
+_cache_keys: LRUCache = LRUCache(maxsize=4096)
+
+
+def _now_ms() -> int:
+    """Current wall-clock time as integer epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable snapshot of a params value (scalars are tagged with their type so 1 != True != "1")"""
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((key, _freeze(item)) for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_freeze(item) for item in value))
+    return (value.__class__, value)
+
 
 class MongoDBUnavailableError(Exception):
     """Raised when MongoDB cache is required but unavailable"""
@@ -28,13 +64,29 @@ class AmadeusCacheService:
     # Longer TTLs for static data, shorter for pricing
     ENDPOINT_TTL = {
         "/v1/reference-data/locations/hotels/by-city": 24 * 7,  # 7 days - hotel lists are relatively static
-        "/v3/shopping/hotel-offers": 720,  # 
-        "/v2/shopping/hotel-offers": 720,  #
+        "/v3/shopping/hotel-offers": 0.25,  # 15 minutes - prices and availability are volatile
+        "/v2/shopping/hotel-offers": 0.25,  # (also covers the per-hotel /by-hotel entries)
         "/maps/api/place": 24 * 7 * 30,  # Google Places data is relatively static
         "/v1/security/oauth2/token": 1,  # tokens expire
         "default": 720  # 1 month default
     }
     
+    # Prefix rules resolved once at class load: one anchored alternation, most
+    # specific (longest) prefix first so the first alternative that matches wins
+    _TTL_PREFIXES = {prefix: ttl for prefix, ttl in ENDPOINT_TTL.items() if prefix != "default"}
+    _TTL_PREFIX_RE = re.compile("|".join(
+        re.escape(prefix) for prefix in sorted(_TTL_PREFIXES, key=len, reverse=True)
+    ))
+    
+    # Fields actually read back on a hit (skips endpoint/params/metadata on the wire)
+    _PAYLOAD_PROJECTION = {"_id": 0, "codec": 1, "response_z": 1}
+    
+    # Only endpoints cached at least this long are kept in the in-process front cache
+    L1_MIN_TTL_HOURS = 24
+    
+    # Compressed payloads larger than this are decoded in a worker thread, off the event loop
+    OFFLOAD_DECODE_BYTES = 64 * 1024
+    
     def __init__(self, enable_cache: Optional[bool] = None):
         """
         Initialize cache service
@@ -48,36 +100,68 @@ class AmadeusCacheService:
         else:
             self.enabled = enable_cache
         
-        self.client: Optional[MongoClient] = None
+        self.client: Optional[AsyncMongoClient] = None
         self.db = None
         self.collection = None
         
-        if self.enabled:
-            self._connect()
+        # The async driver runs on the event loop, so connect lazily on first use
+        self._connect_lock = asyncio.Lock()
+        
+        # Lookups currently in flight, keyed by cache_key (concurrent gets share one query)
+        self._inflight_gets: Dict[bytes, asyncio.Future] = {}
+        
+        # Per-process front cache for read-mostly endpoints, so repeat hits skip the Mongo round-trip
+        self._l1: TTLCache = TTLCache(
+            maxsize=int(os.getenv("CACHE_L1_SIZE", "8192")),
+            ttl=float(os.getenv("CACHE_L1_TTL", "60"))
+        )
+    
+    async def _ensure_connected(self):
+        """Connect on first use; concurrent callers wait for the same attempt"""
+        if self.collection is not None:
+            return
+        async with self._connect_lock:
+            if self.collection is None:
+                await self._connect()
     
-    def _connect(self):
+    async def _connect(self):
         """Connect to MongoDB - raises error if connection fails"""
         try:
             mongo_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
             db_name = os.getenv("MONGODB_DB_NAME", "amadeus_cache")
             
-            self.client = MongoClient(
+            client = AsyncMongoClient(
                 mongo_url,
                 serverSelectionTimeoutMS=2000,  # 2 second timeout
-                connectTimeoutMS=2000
+                connectTimeoutMS=2000,
+                compressors="zstd,zlib",  # Compress traffic on the wire (zstd uses the zstandard package)
+                maxPoolSize=int(os.getenv("CACHE_POOL", "64"))  # Concurrent cache operations per process
             )
             
             # Test connection
-            self.client.admin.command('ping')
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                await client.close()
+                raise
             
-            self.db = self.client[db_name]
-            self.collection = self.db["api_responses"]
+            db = client[db_name]
+            # Reads come back as raw BSON: only the projected payload fields are ever inflated,
+            # and the compressed blob is handed to zstd as-is
+            collection = db.get_collection(
+                "api_responses",
+                codec_options=CodecOptions(document_class=RawBSONDocument)
+            )
             
             # Create indexes for efficient queries
-            self.collection.create_index("cache_key", unique=True)
-            self.collection.create_index("expires_at", expireAfterSeconds=0)  # TTL index
+            await collection.create_index("cache_key", unique=True)
+            await collection.create_index("expires_at", expireAfterSeconds=0)  # TTL index
+            
+            self.client = client
+            self.db = db
+            self.collection = collection
             
-            print("MongoDB cache connected successfully")
+            logger.info("MongoDB cache connected successfully")
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             error_msg = (
@@ -85,7 +169,7 @@ class AmadeusCacheService:
                 f"Connection error: {e}\n"
                 f"To start MongoDB, run: ./start-mogodb.sh"
             )
-            print(error_msg)
+            logger.error(error_msg)
             raise MongoDBUnavailableError(error_msg) from e
         except Exception as e:
             error_msg = (
@@ -93,84 +177,82 @@ class AmadeusCacheService:
                 f"Error: {e}\n"
                 f"To start MongoDB, run: ./start-mogodb.sh"
             )
-            print(error_msg)
+            logger.error(error_msg)
             raise MongoDBUnavailableError(error_msg) from e
     
-    def _normalize_params(self, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Normalize parameters for consistent cache keys
-        - Sort keys
-        - Convert values to strings for consistent hashing
-        - Remove None values
-        """
-        if not params:
-            return {}
-        
-        normalized = {}
-        for key, value in sorted(params.items()):
-            if value is not None:
-                # Convert to string for consistent hashing
-                if isinstance(value, (list, dict)):
-                    normalized[key] = json.dumps(value, sort_keys=True)
-                else:
-                    normalized[key] = str(value)
-        
-        return normalized
-    
-    def _generate_cache_key(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    def _generate_cache_key(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> bytes:
         """
         Generate deterministic cache key from endpoint and normalized params
         
+        Keys are memoized, so repeated (endpoint, params) pairs skip the JSON + hashing work.
+        
         Args:
             endpoint: API endpoint path
             params: Request parameters
             
         Returns:
-            SHA256 hash of endpoint + normalized params
+            Raw 32-byte BLAKE2b-256 digest of endpoint + normalized params (stored as BSON binary,
+            half the size of the hex form in documents and in the unique index)
+        """
+        try:
+            memo_key = (endpoint, _freeze(params or {}))
+            cache_key = _cache_keys.get(memo_key)
+        except TypeError:
+            # Unhashable or unsortable params - derive the key directly
+            return derive_cache_key(endpoint, params)
+        
+        if cache_key is None:
+            cache_key = derive_cache_key(endpoint, params)
+            _cache_keys[memo_key] = cache_key
+        return cache_key
+    
+    def _generate_cache_keys(
+        self,
+        endpoint: str,
+        params_list: List[Optional[Dict[str, Any]]]
+    ) -> List[bytes]:
+        """
+        Generate cache keys for many params of one endpoint (same keys as _generate_cache_key)
+        
+        Memoized keys are resolved first; the misses are then serialized and hashed in one
+        tight pass with the endpoint prefix encoded only once.
         """
-        normalized_params = self._normalize_params(params)
+        cache_keys: List[Optional[bytes]] = [None] * len(params_list)
+        pending = []
+        for index, params in enumerate(params_list):
+            try:
+                memo_key = (endpoint, _freeze(params or {}))
+                cache_keys[index] = _cache_keys.get(memo_key)
+            except TypeError:
+                memo_key = None
+            if cache_keys[index] is None:
+                pending.append((index, memo_key, params))
         
-        # Create a consistent string representation
-        key_string = f"{endpoint}:{json.dumps(normalized_params, sort_keys=True)}"
+        if pending:
+            digests = derive_cache_keys(endpoint, [params for _, _, params in pending])
+            for (index, memo_key, _), digest in zip(pending, digests):
+                cache_keys[index] = digest
+                if memo_key is not None:
+                    _cache_keys[memo_key] = digest
         
-        # Generate SHA256 hash for deterministic key
-        return hashlib.sha256(key_string.encode()).hexdigest()
+        return cache_keys
     
-    def _get_ttl_hours(self, endpoint: str) -> float:
-        """Get TTL in hours for a specific endpoint"""
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def _get_ttl_hours(cls, endpoint: str) -> float:
+        """Get TTL in hours for a specific endpoint (memoized; ENDPOINT_TTL is constant)"""
         # Check exact match first
-        if endpoint in self.ENDPOINT_TTL:
-            return self.ENDPOINT_TTL[endpoint]
+        ttl = cls.ENDPOINT_TTL.get(endpoint)
+        if ttl is not None:
+            return ttl
         
-        # Check prefix match for versioned endpoints
-        for cached_endpoint, ttl in self.ENDPOINT_TTL.items():
-            if cached_endpoint != "default" and endpoint.startswith(cached_endpoint):
-                return ttl
+        # Check prefix match for versioned endpoints (longest prefix wins)
+        match = cls._TTL_PREFIX_RE.match(endpoint)
+        if match:
+            return cls._TTL_PREFIXES[match.group()]
         
         # Return default TTL
-        return self.ENDPOINT_TTL["default"]
-    
-    def _find_cache_doc(self, cache_key: str):
-        """Helper method to find cache document (synchronous)"""
-        if self.collection is None:
-            return None
-        return self.collection.find_one({"cache_key": cache_key})
-    
-    def _delete_cache_doc(self, cache_key: str):
-        """Helper method to delete cache document (synchronous)"""
-        if self.collection is None:
-            return
-        return self.collection.delete_one({"cache_key": cache_key})
-    
-    def _store_cache_doc(self, cache_key: str, cache_doc: Dict[str, Any]):
-        """Helper method to store cache document (synchronous)"""
-        if self.collection is None:
-            return
-        self.collection.replace_one(
-            {"cache_key": cache_key},
-            cache_doc,
-            upsert=True
-        )
+        return cls.ENDPOINT_TTL["default"]
     
     async def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
@@ -186,78 +268,122 @@ class AmadeusCacheService:
         Raises:
             MongoDBUnavailableError: If MongoDB is not available
         """
-        # Check if cache is required but unavailable
-        if self.enabled and self.collection is None:
-            raise MongoDBUnavailableError(
-                "MongoDB cache is required but unavailable. Please start MongoDB before running the application.\n"
-                "To start MongoDB, run: ./start-mogodb.sh"
-            )
-        
-        # If cache is disabled, return None (this shouldn't happen if enabled=True, but handle gracefully)
+        # If cache is disabled, return None
         if not self.enabled:
             return None
         
+        cache_key = self._generate_cache_key(endpoint, params)
+        cached = self._l1.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Connect on first use (raises MongoDBUnavailableError if MongoDB is down)
+        await self._ensure_connected()
+        
+        # Concurrent lookups of the same key share a single MongoDB query
+        return await single_flight(
+            self._inflight_gets, cache_key, lambda: self._lookup(cache_key, endpoint, params)
+        )
+    
+    async def _lookup(
+        self,
+        cache_key: bytes,
+        endpoint: str,
+        params: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch and decode a single cache document"""
         try:
-            cache_key = self._generate_cache_key(endpoint, params)
-            
-            # Run MongoDB operation in thread pool (pymongo is synchronous)
-            loop = asyncio.get_event_loop()
-            cached_doc = await loop.run_in_executor(
-                None,
-                self._find_cache_doc,
-                cache_key
+            # Expired entries are filtered by the query; the TTL index garbage-collects them
+            cached_doc = await self.collection.find_one(
+                {"cache_key": cache_key, "expires_at_ms": {"$gt": _now_ms()}},
+                projection=self._PAYLOAD_PROJECTION
             )
             
             if not cached_doc:
-                # Log cache miss for Google Places endpoints
-                if "/maps/api/place" in endpoint:
-                    place_id = params.get("place_id", "unknown") if params else "unknown"
-                    print(f"Cache MISS for Google Places endpoint: {endpoint} (place_id: {place_id})")
-                else:
-                    print(f"Cache MISS for endpoint: {endpoint}")
-                return None
-            
-            # Check if expired (TTL index should handle this, but double-check)
-            expires_at = cached_doc.get("expires_at")
-            if expires_at and datetime.utcnow() > expires_at:
-                # Remove expired entry
-                await loop.run_in_executor(
-                    None,
-                    self._delete_cache_doc,
-                    cache_key
-                )
-                # Log expired cache for Google Places
-                if "/maps/api/place" in endpoint:
-                    place_id = params.get("place_id", "unknown") if params else "unknown"
-                    print(f"Cache EXPIRED for Google Places endpoint: {endpoint} (place_id: {place_id})")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Cache MISS for endpoint: %s%s", endpoint, self._place_suffix(endpoint, params))
                 return None
             
             # Return cached response
-            if "/maps/api/place" in endpoint:
-                place_id = params.get("place_id", "unknown") if params else "unknown"
-                print(f"Cache HIT for Google Places endpoint: {endpoint} (place_id: {place_id})")
-            else:
-                print(f"Cache HIT for endpoint: {endpoint}")
-            return cached_doc.get("response_data")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Cache HIT for endpoint: %s%s", endpoint, self._place_suffix(endpoint, params))
+            response_data = await self._decode_payload_async(cached_doc)
+            if self._use_l1(self._get_ttl_hours(endpoint)):
+                self._l1[cache_key] = response_data
+            return response_data
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            # MongoDB connection error - raise exception
-            error_msg = (
-                f"MongoDB cache connection lost during operation. Please ensure MongoDB is running.\n"
-                f"Connection error: {e}\n"
-                f"To start MongoDB, run: ./start-mogodb.sh"
-            )
-            raise MongoDBUnavailableError(error_msg) from e
+            raise self._connection_lost_error(e) from e
         except Exception as e:
-            # Re-raise MongoDBUnavailableError if that's what was raised
-            if isinstance(e, MongoDBUnavailableError):
-                raise
             # For other non-connection errors, log and return None to allow API call
             # This handles cases like query errors, but MongoDB is still available
-            print(f"Error retrieving from cache (non-connection error): {e}")
+            logger.warning("Error retrieving from cache (non-connection error): %s", e)
             return None
     
-    async def set(self, endpoint: str, params: Optional[Dict[str, Any]], response_data: Dict[str, Any]):
+    async def get_many(
+        self,
+        endpoint: str,
+        params_list: List[Optional[Dict[str, Any]]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Retrieve several cached responses for one endpoint with a single MongoDB query
+        
+        Args:
+            endpoint: API endpoint path
+            params_list: Request parameters for each entry
+            
+        Returns:
+            Cached response data (or None if not found/expired) for each entry, in order
+            
+        Raises:
+            MongoDBUnavailableError: If MongoDB is not available
+        """
+        if not self.enabled or not params_list:
+            return [None] * len(params_list)
+        
+        cache_keys = self._generate_cache_keys(endpoint, params_list)
+        l1 = self._l1
+        # One get() per key: a TTLCache entry can expire between an `in` check and indexing
+        found = {}
+        for cache_key in cache_keys:
+            response_data = l1.get(cache_key)
+            if response_data is not None:
+                found[cache_key] = response_data
+        missing_keys = [cache_key for cache_key in cache_keys if cache_key not in found]
+        if not missing_keys:
+            return [found[cache_key] for cache_key in cache_keys]
+        
+        # Connect on first use (raises MongoDBUnavailableError if MongoDB is down)
+        await self._ensure_connected()
+        
+        try:
+            use_l1 = self._use_l1(self._get_ttl_hours(endpoint))
+            cursor = self.collection.find(
+                {"cache_key": {"$in": missing_keys}, "expires_at_ms": {"$gt": _now_ms()}},
+                projection={"cache_key": 1, **self._PAYLOAD_PROJECTION}
+            )
+            async for cached_doc in cursor:
+                response_data = await self._decode_payload_async(cached_doc)
+                found[cached_doc["cache_key"]] = response_data
+                if use_l1:
+                    l1[cached_doc["cache_key"]] = response_data
+            
+            logger.debug("Cache bulk lookup for endpoint: %s (%d/%d hits)", endpoint, len(found), len(cache_keys))
+            return [found.get(cache_key) for cache_key in cache_keys]
+            
+        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+            raise self._connection_lost_error(e) from e
+        except Exception as e:
+            logger.warning("Error retrieving from cache (non-connection error): %s", e)
+            return [found.get(cache_key) for cache_key in cache_keys]
+    
+    async def set(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        response_data: Dict[str, Any],
+        ttl_hours: Optional[float] = None
+    ):
         """
         Store API response in cache with expiration
         
@@ -265,72 +391,166 @@ class AmadeusCacheService:
             endpoint: API endpoint path
             params: Request parameters
             response_data: API response data to cache
+            ttl_hours: Override for the endpoint's configured TTL
             
         Raises:
             MongoDBUnavailableError: If MongoDB is not available
         """
-        # Check if cache is required but unavailable
-        if self.enabled and self.collection is None:
-            raise MongoDBUnavailableError(
-                "MongoDB cache is required but unavailable. Please start MongoDB before running the application.\n"
-                "To start MongoDB, run: ./start-mogodb.sh"
-            )
-        
-        # If cache is disabled, silently return (this shouldn't happen if enabled=True)
+        # If cache is disabled, silently return
         if not self.enabled:
             return
         
+        # Connect on first use (raises MongoDBUnavailableError if MongoDB is down)
+        await self._ensure_connected()
+        
         try:
             cache_key = self._generate_cache_key(endpoint, params)
-            ttl_hours = self._get_ttl_hours(endpoint)
-            expires_at = datetime.utcnow() + timedelta(hours=ttl_hours)
+            if ttl_hours is None:
+                ttl_hours = self._get_ttl_hours(endpoint)
             
             # Store in MongoDB
-            cache_doc = {
-                "cache_key": cache_key,
-                "endpoint": endpoint,
-                "params": params,
-                "response_data": response_data,
-                "created_at": datetime.utcnow(),
-                "expires_at": expires_at,
-                "ttl_hours": ttl_hours
-            }
+            cache_doc = self._build_cache_doc(cache_key, endpoint, params, response_data, ttl_hours)
             
-            # Run MongoDB operation in thread pool (pymongo is synchronous)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                self._store_cache_doc,
-                cache_key,
-                cache_doc
+            await self.collection.replace_one(
+                {"cache_key": cache_key},
+                cache_doc,
+                upsert=True
             )
+            if self._use_l1(ttl_hours):
+                self._l1[cache_key] = response_data
             
-            # Log cache write with more detail for Google Places
-            if "/maps/api/place" in endpoint:
-                place_id = params.get("place_id", "unknown") if params else "unknown"
-                print(f"Cache STORED for Google Places endpoint: {endpoint} (place_id: {place_id}, TTL: {ttl_hours}h)")
-            else:
-                print(f"Cache STORED for endpoint: {endpoint} (TTL: {ttl_hours}h)")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Cache STORED for endpoint: %s%s (TTL: %sh)",
+                    endpoint, self._place_suffix(endpoint, params), ttl_hours
+                )
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            # MongoDB connection error - raise exception
-            error_msg = (
-                f"MongoDB cache connection lost during operation. Please ensure MongoDB is running.\n"
-                f"Connection error: {e}\n"
-                f"To start MongoDB, run: ./start-mogodb.sh"
-            )
-            raise MongoDBUnavailableError(error_msg) from e
+            raise self._connection_lost_error(e) from e
         except Exception as e:
-            # Re-raise MongoDBUnavailableError if that's what was raised
-            if isinstance(e, MongoDBUnavailableError):
-                raise
             # For other non-connection errors, log but don't abort - allow operation to continue
             # This handles cases like write errors, validation errors, etc. where MongoDB is still available
-            print(f"Warning: Error storing in cache (non-connection error): {e}")
-            print("Continuing without caching - API response will not be cached")
+            logger.warning("Error storing in cache, continuing without caching (non-connection error): %s", e)
             # Don't raise - allow the API response to be returned even if caching fails
     
+    async def set_many(
+        self,
+        endpoint: str,
+        entries: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]],
+        ttl_hours: Optional[float] = None
+    ):
+        """
+        Store several API responses for one endpoint with a single bulk write
+        
+        Args:
+            endpoint: API endpoint path
+            entries: (params, response_data) pairs to cache
+            ttl_hours: Override for the endpoint's configured TTL
+            
+        Raises:
+            MongoDBUnavailableError: If MongoDB is not available
+        """
+        if not self.enabled or not entries:
+            return
+        
+        # Connect on first use (raises MongoDBUnavailableError if MongoDB is down)
+        await self._ensure_connected()
+        
+        try:
+            if ttl_hours is None:
+                ttl_hours = self._get_ttl_hours(endpoint)
+            
+            operations = []
+            written = {}
+            cache_keys = self._generate_cache_keys(endpoint, [params for params, _ in entries])
+            for cache_key, (params, response_data) in zip(cache_keys, entries):
+                cache_doc = self._build_cache_doc(cache_key, endpoint, params, response_data, ttl_hours)
+                operations.append(ReplaceOne({"cache_key": cache_key}, cache_doc, upsert=True))
+                written[cache_key] = response_data
+            
+            await self.collection.bulk_write(operations, ordered=False)
+            if self._use_l1(ttl_hours):
+                self._l1.update(written)
+            logger.debug("Cache STORED %d entries for endpoint: %s (TTL: %sh)", len(operations), endpoint, ttl_hours)
+            
+        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+            raise self._connection_lost_error(e) from e
+        except Exception as e:
+            # Don't raise - the API responses are still returned even if caching fails
+            logger.warning("Error storing in cache (non-connection error): %s", e)
+    
+    def _build_cache_doc(
+        self,
+        cache_key: bytes,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        response_data: Dict[str, Any],
+        ttl_hours: float
+    ) -> Dict[str, Any]:
+        """Build the MongoDB document for a cache entry (payload zstd-compressed)"""
+        now_ms = _now_ms()
+        expires_ms = now_ms + int(ttl_hours * 3_600_000)
+        return {
+            "cache_key": cache_key,
+            "endpoint": endpoint,
+            "params": params,
+            "codec": PAYLOAD_CODEC,
+            "response_z": Binary(_compressor.compress(orjson.dumps(response_data))),
+            "created_at_ms": now_ms,
+            "expires_at_ms": expires_ms,
+            # Date-typed copy only for the TTL index (Mongo expires Date fields, not ints)
+            "expires_at": datetime.fromtimestamp(expires_ms / 1000, timezone.utc),
+            "ttl_hours": ttl_hours
+        }
+    
+    @staticmethod
+    def _place_suffix(endpoint: str, params: Optional[Dict[str, Any]]) -> str:
+        """Extra log context for Google Places entries (only built when debug logging is on)"""
+        if "/maps/api/place" not in endpoint:
+            return ""
+        place_id = params.get("place_id", "unknown") if params else "unknown"
+        return f" (place_id: {place_id})"
+    
+    def _use_l1(self, ttl_hours: float) -> bool:
+        """Whether entries with this TTL are stable enough for the in-process front cache"""
+        return ttl_hours >= self.L1_MIN_TTL_HOURS
+    
+    async def _decode_payload_async(self, cached_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Decode a cache document, moving large decompress + parse work to a worker thread"""
+        if len(cached_doc["response_z"]) > self.OFFLOAD_DECODE_BYTES:
+            # zstd decompressors are not safe to share across threads, so the worker gets its own
+            return await asyncio.to_thread(self._decode_payload, cached_doc, zstandard.ZstdDecompressor())
+        return self._decode_payload(cached_doc)
+    
+    @staticmethod
+    def _decode_payload(
+        cached_doc: Dict[str, Any],
+        decompressor: zstandard.ZstdDecompressor = _decompressor
+    ) -> Optional[Dict[str, Any]]:
+        """Decode the response stored in a cache document according to its codec"""
+        codec = cached_doc["codec"]
+        if codec != PAYLOAD_CODEC:
+            raise ValueError(f"Unsupported cache payload codec: {codec}")
+        return orjson.loads(decompressor.decompress(cached_doc["response_z"]))
+    
+    @staticmethod
+    def _connection_lost_error(error: Exception) -> MongoDBUnavailableError:
+        """Build the error raised when MongoDB drops mid-operation"""
+        return MongoDBUnavailableError(
+            f"MongoDB cache connection lost during operation. Please ensure MongoDB is running.\n"
+            f"Connection error: {error}\n"
+            f"To start MongoDB, run: ./start-mogodb.sh"
+        )
+    
     def is_available(self) -> bool:
         """Check if cache is available and enabled"""
         return self.enabled and self.collection is not None
+    
+    async def aclose(self):
+        """Close the MongoDB client"""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.db = None
+            self.collection = None
 
@@ -1,27 +1,167 @@
 import os
 import httpx
 import asyncio
+import functools
+import logging
+import math
+import random
+import re
+from collections import Counter
 import argparse
 import json
-from typing import Optional, Dict, Any, List
+import orjson
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlencode
+from cachetools import LRUCache
 from dotenv import load_dotenv
 from services.cache_service import AmadeusCacheService
+from services.single_flight import single_flight
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+@functools.lru_cache(maxsize=4096)
+def _norm_name(name: str) -> str:
+    """Lowercased, punctuation-stripped hotel name (memoized; the same names recur across lookups)"""
+    return _NON_WORD.sub(" ", name.lower()).strip()
+
+
+@functools.lru_cache(maxsize=4096)
+def _bigrams(name: str) -> Tuple[Counter, float]:
+    """Character-bigram counts of a normalized name and their vector norm"""
+    counts = Counter(name[i:i + 2] for i in range(len(name) - 1))
+    return counts, math.sqrt(sum(count * count for count in counts.values()))
+
+
+def _bigram_similarity(a: str, b: str) -> float:
+    """Cosine similarity of two names' character bigrams, scaled to 0-100 (linear in name length)"""
+    a_counts, a_norm = _bigrams(a)
+    b_counts, b_norm = _bigrams(b)
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a_counts) > len(b_counts):
+        a_counts, b_counts = b_counts, a_counts
+    dot = sum(count * b_counts[gram] for gram, count in a_counts.items())
+    return 100.0 * dot / (a_norm * b_norm)
+
 
 class GooglePlacesService:
     """Service for interacting with Google Places API (New) to get reviews and images"""
     
-    def __init__(self):
+    # Text Search body fields that never change between requests
+    SEARCH_BODY_CONSTANTS = {"maxResultCount": 1, "includedType": "lodging"}
+    
+    # Attempts per Places request for transient failures (429, 5xx, timeouts, network errors)
+    MAX_ATTEMPTS = 4
+    
+    # Place Details field masks narrowed to the sub-fields get_place_details consumes
+    # (Google bills and transfers per returned field)
+    DETAILS_FIELD_MASK = "id,displayName.text,formattedAddress,rating,userRatingCount"
+    REVIEWS_FIELD_MASK = (
+        "reviews.authorAttribution.displayName,reviews.rating,reviews.text.text,"
+        "reviews.publishTime,reviews.relativePublishTimeDescription"
+    )
+    PHOTOS_FIELD_MASK = "photos.name,photos.widthPx,photos.heightPx,photos.authorAttributions"
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: Shared pooled client to reuse across services; a private one is created if omitted
+        """
         self.api_key = os.getenv("GOOGLE_PLACES_API_KEY")
         self.base_url = "https://places.googleapis.com/v1"
         
+        # API key query parameter for photo media URLs (URL-encoded once)
+        self._media_key_qs = urlencode({"key": self.api_key or ""})
+        
+        # Text Search headers are identical for every lookup, so build them once
+        self._search_headers = {
+            "Content-Type": "application/json",
+            "X-Goog-Api-Key": self.api_key or "",
+            "X-Goog-FieldMask": "places.id,places.displayName,places.formattedAddress"
+        }
+        
         # Initialize cache service for Google Places API calls
         self.cache_service = AmadeusCacheService()
         
+        # Resolved place IDs keyed by (name, address, lat, lng rounded to ~100 m); MongoDB backs it
+        self._place_id_cache: LRUCache = LRUCache(maxsize=4096)
+        
+        # Lookups currently in flight, keyed by kind + lookup key
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        
+        # Long-lived client so connections (and TLS sessions) are reused across requests.
+        # A shared client is borrowed; otherwise one is created lazily on first use and owned here.
+        self._http: Optional[httpx.AsyncClient] = http_client
+        self._owns_http = http_client is None
+        
         if not self.api_key:
-            print("Warning: GOOGLE_PLACES_API_KEY not set. Google Places features will be unavailable.")
+            logger.warning("GOOGLE_PLACES_API_KEY not set. Google Places features will be unavailable.")
+    
+    @staticmethod
+    def _bare_id(resource_name: str) -> str:
+        """Last path segment of a resource name (places/ChIJ... -> ChIJ...); bare IDs pass through"""
+        return resource_name.rpartition("/")[2] or resource_name
+    
+    def _client(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client, creating it on first use (inside the running event loop)"""
+        if self._http is None:
+            # All traffic goes to places.googleapis.com, so HTTP/2 multiplexes concurrent lookups
+            # over a few connections; set HTTP2_ENABLED=false to fall back to HTTP/1.1
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=os.getenv("HTTP2_ENABLED", "true").lower() == "true",
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=50),
+                timeout=10.0
+            )
+        return self._http
+    
+    async def _request_json(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """
+        Send a Places API request and decode the JSON body
+        
+        Args:
+            method: HTTP method
+            path: Path under the Places API base URL (e.g. "/places:searchText")
+        
+        Transient failures (429, 5xx, timeouts, network errors) are retried with exponential
+        backoff plus jitter; other 4xx responses are raised immediately. The body is read into
+        one bytes buffer and handed to orjson directly, so no intermediate str copy is made.
+        
+        Raises:
+            httpx.HTTPStatusError: If the API returns an error status
+            httpx.TransportError: If the last attempt fails at the network level
+        """
+        client = self._client()
+        # Our own client carries base_url; a borrowed shared client needs the absolute URL
+        url = path if self._owns_http else self.base_url + path
+        for attempt in range(self.MAX_ATTEMPTS):
+            last_attempt = attempt == self.MAX_ATTEMPTS - 1
+            try:
+                response = await client.request(method, url, timeout=10.0, **kwargs)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                if last_attempt:
+                    raise
+                logger.debug("Places request failed (%s), retrying: %s", e.__class__.__name__, url)
+            else:
+                if last_attempt or (response.status_code < 500 and response.status_code != 429):
+                    response.raise_for_status()
+                    return orjson.loads(await response.aread())
+                logger.debug("Places request returned %s, retrying: %s", response.status_code, url)
+            
+            await asyncio.sleep(min(0.1 * 2 ** attempt + random.random() * 0.1, 2.0))
+    
+    async def aclose(self):
+        """Close the HTTP client if this service created it (a shared client is closed by its owner)"""
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await self.cache_service.aclose()
     
     async def find_place_id(
         self, 
@@ -46,18 +186,53 @@ class GooglePlacesService:
         if not self.api_key:
             return None
         
+        lookup_key = (
+            hotel_name.strip().lower(),
+            address.strip().lower(),
+            round(latitude or 0, 3),
+            round(longitude or 0, 3)
+        )
+        place_id = self._place_id_cache.get(lookup_key)
+        if place_id:
+            return place_id
+        
+        return await single_flight(
+            self._inflight,
+            ("place_id", lookup_key),
+            lambda: self._search_place_id(hotel_name, address, latitude, longitude, lookup_key)
+        )
+    
+    async def _search_place_id(
+        self,
+        hotel_name: str,
+        address: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        lookup_key: tuple
+    ) -> Optional[str]:
+        """Resolve a Place ID through the MongoDB cache, then Text Search (see find_place_id)"""
         try:
             # Use Text Search API (New) with name and address
-            endpoint = f"{self.base_url}/places:searchText"
+            endpoint = "/places:searchText"
+            
+            # Resolved IDs are shared across workers through the MongoDB cache
+            cache_key_params = {
+                "hotel_name": lookup_key[0],
+                "address": lookup_key[1],
+                "latitude": lookup_key[2],
+                "longitude": lookup_key[3]
+            }
+            cached_response = await self.cache_service.get(endpoint, cache_key_params)
+            if cached_response and cached_response.get("place_id"):
+                place_id = cached_response["place_id"]
+                self._place_id_cache[lookup_key] = place_id
+                return place_id
             
             # Build text query
             query = f"{hotel_name} {address}"
             
-            # Prepare request body
-            request_body: Dict[str, Any] = {
-                "textQuery": query,
-                "maxResultCount": 1
-            }
+            # Prepare request body (lodging-only, single best candidate)
+            request_body: Dict[str, Any] = {"textQuery": query, **self.SEARCH_BODY_CONSTANTS}
             
             # Add location bias if coordinates available
             if latitude and longitude:
@@ -71,41 +246,34 @@ class GooglePlacesService:
                     }
                 }
             
-            # Add place type filter for lodging
-            request_body["includedType"] = "lodging"
-            
-            # Prepare headers
-            headers = {
-                "Content-Type": "application/json",
-                "X-Goog-Api-Key": self.api_key,
-                "X-Goog-FieldMask": "places.id,places.displayName,places.formattedAddress"
-            }
-            
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(endpoint, json=request_body, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                if "places" in data and data["places"]:
-                    # Find best match by comparing name similarity
-                    best_match = self._find_best_match(data["places"], hotel_name, address)
-                    if best_match:
-                        place_id = best_match.get("id")
-                        if place_id:
-                            # Extract just the ID if it's a full resource name (places/ChIJ...)
-                            if "/" in place_id:
-                                place_id = place_id.split("/")[-1]
-                            print(f"Found Place ID using text search: {place_id}")
-                            return place_id
+            data = await self._request_json(
+                "POST",
+                endpoint,
+                content=orjson.dumps(request_body),
+                headers=self._search_headers
+            )
             
-            print(f"Could not find Place ID for hotel: {hotel_name}")
+            if "places" in data and data["places"]:
+                # Find best match by comparing name similarity
+                best_match = self._find_best_match(data["places"], hotel_name, address)
+                if best_match:
+                    place_id = best_match.get("id")
+                    if place_id:
+                        # Extract just the ID if it's a full resource name (places/ChIJ...)
+                        place_id = self._bare_id(place_id)
+                        logger.debug("Found Place ID using text search: %s", place_id)
+                        self._place_id_cache[lookup_key] = place_id
+                        await self.cache_service.set(endpoint, cache_key_params, {"place_id": place_id})
+                        return place_id
+        
+            logger.info("Could not find Place ID for hotel: %s", hotel_name)
             return None
             
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error finding Place ID: {e.response.status_code} - {e.response.text}")
+            logger.warning("HTTP error finding Place ID: %s - %s", e.response.status_code, e.response.text)
             return None
         except Exception as e:
-            print(f"Error finding Place ID: {e}")
+            logger.warning("Error finding Place ID: %s", e)
             return None
     
     def _find_best_match(
@@ -129,42 +297,39 @@ class GooglePlacesService:
         if not results:
             return None
         
-        hotel_name_lower = hotel_name.lower()
+        # A single candidate is returned either way (best match or fallback), so skip scoring
+        if len(results) == 1:
+            return results[0]
         
-        # Score each result based on name similarity
-        scored_results = []
-        for result in results:
-            # New API uses displayName.text instead of name
-            display_name = result.get("displayName", {})
-            result_name = display_name.get("text", "").lower() if isinstance(display_name, dict) else ""
-            
-            score = 0
-            
-            # Exact name match gets highest score
-            if result_name == hotel_name_lower:
-                score = 100
-            # Partial name match
-            elif hotel_name_lower in result_name or result_name in hotel_name_lower:
-                score = 80
-            # Check if key words match
-            else:
-                hotel_words = set(hotel_name_lower.split())
-                result_words = set(result_name.split())
-                common_words = hotel_words.intersection(result_words)
-                if common_words:
-                    score = len(common_words) * 10
-            
-            scored_results.append((score, result))
+        # New API uses displayName.text instead of name
+        names = [
+            result["displayName"].get("text", "") if isinstance(result.get("displayName"), dict) else ""
+            for result in results
+        ]
         
-        # Sort by score and return best match
-        scored_results.sort(key=lambda x: x[0], reverse=True)
+        # Exact name match wins outright
+        hotel_name_norm = _norm_name(hotel_name)
+        names = [_norm_name(name) for name in names]
+        for result, name in zip(results, names):
+            if name == hotel_name_norm:
+                return result
+        
+        # Score the rest on bigram cosine; one name containing the other scores at least 80
+        best_score = 0.0
+        best_result = None
+        for result, name in zip(results, names):
+            score = _bigram_similarity(hotel_name_norm, name)
+            if name and (name in hotel_name_norm or hotel_name_norm in name):
+                score = max(score, 80.0)
+            if score > best_score:
+                best_score, best_result = score, result
         
         # Only return if score is reasonable (at least 50)
-        if scored_results and scored_results[0][0] >= 50:
-            return scored_results[0][1]
+        if best_score >= 50:
+            return best_result
         
         # Fallback to first result if no good match
-        return results[0] if results else None
+        return results[0]
     
     async def get_place_details(
         self, 
@@ -186,17 +351,30 @@ class GooglePlacesService:
         if not self.api_key or not place_id:
             return None
         
+        # Ensure place_id is just the ID, not the full resource name
+        clean_place_id = self._bare_id(place_id)
+        return await single_flight(
+            self._inflight,
+            ("details", clean_place_id, include_reviews, include_photos),
+            lambda: self._fetch_place_details(clean_place_id, include_reviews, include_photos)
+        )
+    
+    async def _fetch_place_details(
+        self,
+        clean_place_id: str,
+        include_reviews: bool,
+        include_photos: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Load place details from the MongoDB cache or the Places API (see get_place_details)"""
         try:
-            # Ensure place_id is just the ID, not the full resource name
-            clean_place_id = place_id.split("/")[-1] if "/" in place_id else place_id
-            endpoint = f"{self.base_url}/places/{clean_place_id}"
+            endpoint = f"/places/{clean_place_id}"
             
-            # Build field mask for requested fields
-            field_mask_parts = ["id", "displayName", "formattedAddress", "rating", "userRatingCount"]
+            # Build field mask for requested fields (only the sub-fields we actually read)
+            field_mask_parts = [self.DETAILS_FIELD_MASK]
             if include_reviews:
-                field_mask_parts.append("reviews")
+                field_mask_parts.append(self.REVIEWS_FIELD_MASK)
             if include_photos:
-                field_mask_parts.append("photos")
+                field_mask_parts.append(self.PHOTOS_FIELD_MASK)
             
             field_mask = ",".join(field_mask_parts)
             
@@ -209,82 +387,66 @@ class GooglePlacesService:
             cache_key_params = {"place_id": clean_place_id, "field_mask": field_mask}
             
             # Check cache first
-            print(f"Checking cache for Google Places data (place_id: {clean_place_id})")
             cached_response = await self.cache_service.get(endpoint, cache_key_params)
             if cached_response:
-                print(f"Google Places cache HIT - returning cached data for place_id: {clean_place_id}")
+                logger.debug("Google Places cache HIT for place_id: %s", clean_place_id)
                 return cached_response
             
-            print(f"Google Places cache MISS - fetching from API for place_id: {clean_place_id}")
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(endpoint, headers=headers)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract display name
-                display_name = result.get("displayName", {})
-                name = display_name.get("text", "") if isinstance(display_name, dict) else ""
-                
-                # Extract reviews (new API structure)
-                reviews = []
-                if include_reviews and "reviews" in result:
-                    for review in result.get("reviews", [])[:5]:  # Limit to 5 reviews
-                        author = review.get("authorAttribution", {})
-                        author_name = author.get("displayName", "") if isinstance(author, dict) else ""
-                        
-                        # New API uses publishTime instead of time
-                        publish_time = review.get("publishTime", "")
-                        relative_time = review.get("relativePublishTimeDescription", "")
-                        
-                        reviews.append({
-                            "author_name": author_name,
-                            "rating": review.get("rating"),
-                            "text": review.get("text", {}).get("text", "") if isinstance(review.get("text"), dict) else review.get("text", ""),
-                            "time": publish_time,
-                            "relative_time_description": relative_time
-                        })
-                
-                # Extract photo references (new API structure)
-                photo_references = []
-                if include_photos and "photos" in result:
-                    for photo in result.get("photos", [])[:10]:  # Limit to 10 photos
-                        # New API uses name field like "places/{place_id}/photos/{photo_id}"
-                        photo_name = photo.get("name", "")
-                        photo_id = photo_name.split("/")[-1] if "/" in photo_name else photo_name
-                        
-                        photo_references.append({
-                            "photo_reference": photo_id,  # Store photo ID for new API
-                            "name": photo_name,  # Store full name for media endpoint
-                            "widthPx": photo.get("widthPx"),
-                            "heightPx": photo.get("heightPx"),
-                            "authorAttributions": photo.get("authorAttributions", [])
-                        })
-                
-                place_details = {
-                    "place_id": clean_place_id,
-                    "name": name,
-                    "address": result.get("formattedAddress", ""),
-                    "rating": result.get("rating"),
-                    "user_ratings_total": result.get("userRatingCount"),
-                    "reviews": reviews,
-                    "photo_references": photo_references
+            logger.debug("Google Places cache MISS - fetching from API for place_id: %s", clean_place_id)
+            result = await self._request_json("GET", endpoint, headers=headers)
+            
+            # Extract display name
+            name = result.get("displayName", {}).get("text", "")
+            
+            # Extract reviews (new API structure; publishTime replaces time), limited to 5
+            reviews = [
+                {
+                    "author_name": review.get("authorAttribution", {}).get("displayName", ""),
+                    "rating": review.get("rating"),
+                    "text": (review.get("text") or {}).get("text", ""),
+                    "time": review.get("publishTime", ""),
+                    "relative_time_description": review.get("relativePublishTimeDescription", "")
+                }
+                for review in result.get("reviews", ())[:5]
+            ] if include_reviews else []
+            
+            # Extract photo references (name is "places/{place_id}/photos/{photo_id}"), limited to 10
+            bare_id = self._bare_id
+            photo_references = [
+                {
+                    "photo_reference": bare_id(photo["name"]),  # Store photo ID for new API
+                    "name": photo["name"],  # Store full name for media endpoint
+                    "widthPx": photo.get("widthPx"),
+                    "heightPx": photo.get("heightPx"),
+                    "authorAttributions": photo.get("authorAttributions", [])
                 }
-                
-                # Cache the response
-                print(f"Storing Google Places data in cache for place_id: {clean_place_id} (name: {place_details.get('name', 'unknown')})")
-                await self.cache_service.set(endpoint, cache_key_params, place_details)
-                print(f"Successfully cached Google Places data for place_id: {clean_place_id}")
-                
-                return place_details
-                
+                for photo in result.get("photos", ())[:10]
+            ] if include_photos else []
+            
+            place_details = {
+                "place_id": clean_place_id,
+                "name": name,
+                "address": result.get("formattedAddress", ""),
+                "rating": result.get("rating"),
+                "user_ratings_total": result.get("userRatingCount"),
+                "reviews": reviews,
+                "photo_references": photo_references
+            }
+            
+            # Cache the response
+            await self.cache_service.set(endpoint, cache_key_params, place_details)
+            logger.debug("Cached Google Places data for place_id: %s (name: %s)", clean_place_id, name)
+            
+            return place_details
+            
         except httpx.HTTPStatusError as e:
-            print(f"HTTP error getting place details: {e.response.status_code} - {e.response.text}")
+            logger.warning("HTTP error getting place details: %s - %s", e.response.status_code, e.response.text)
             return None
         except Exception as e:
-            print(f"Error getting place details: {e}")
+            logger.warning("Error getting place details: %s", e)
             return None
     
-    async def get_photo_url(
+    def get_photo_url(
         self, 
         photo_reference: str, 
         max_width: int = 800,
@@ -308,35 +470,23 @@ class GooglePlacesService:
         
         try:
             # New API uses: places/{place_id}/photos/{photo_id}/media
-            # Prefer photo_name if available (it's the full path)
-            if photo_name and photo_name.startswith("places/"):
-                photo_path = photo_name
-            elif "/" in photo_reference and photo_reference.startswith("places/"):
-                # Assume it's already a full path
-                photo_path = photo_reference
-            else:
+            # Prefer photo_name if available (it's the full path); a reference may already be one too
+            photo_path = photo_name if photo_name and photo_name.startswith("places/") else photo_reference
+            if not photo_path or not photo_path.startswith("places/"):
                 # We need the full photo name path - if we only have photo_reference (ID),
                 # we can't construct the URL without place_id
-                print(f"Warning: Cannot construct photo URL without photo_name for reference: {photo_reference}")
+                logger.warning("Cannot construct photo URL without photo_name for reference: %s", photo_reference)
                 return None
             
-            endpoint = f"{self.base_url}/{photo_path}/media"
-            
-            # Build query parameters
-            params = {
-                "maxWidthPx": max_width,
-                "maxHeightPx": max_height,
-                "key": self.api_key  # API key can be in query for media endpoint
-            }
-            
-            # Construct the full URL
-            # The media endpoint returns a redirect to the actual image
-            query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-            url = f"{endpoint}?{query_string}"
-            return url
+            # The media endpoint returns a redirect to the actual image; the API key
+            # can be passed in the query for this endpoint
+            return (
+                f"{self.base_url}/{photo_path}/media"
+                f"?maxWidthPx={int(max_width)}&maxHeightPx={int(max_height)}&{self._media_key_qs}"
+            )
             
         except Exception as e:
-            print(f"Error getting photo URL: {e}")
+            logger.warning("Error getting photo URL: %s", e)
             return None
     
     async def get_hotel_reviews_and_images(
@@ -407,6 +557,8 @@ async def main():
         print(f"\n✗ Error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await service.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+async def single_flight(
+    inflight: Dict[Hashable, asyncio.Future],
+    key: Hashable,
+    make_call: Callable[[], Awaitable[Any]]
+) -> Any:
+    """
+    Run make_call once per key at a time; concurrent callers with the same key share its result
+    
+    Args:
+        inflight: Registry of running calls, owned by the caller (one per service instance)
+        key: Identity of the call; callers with an equal key join the running task
+        make_call: Starts the call; only invoked when no call for key is in flight
+    
+    Returns:
+        The call's result (its exception is raised to every waiting caller)
+    """
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_call())
+        inflight[key] = task
+        
+        def done(finished: asyncio.Future):
+            if inflight.get(key) is finished:
+                del inflight[key]
+            # Mark the exception retrieved in case every waiter was cancelled before it landed
+            if not finished.cancelled():
+                finished.exception()
+        
+        task.add_done_callback(done)
+    # Shield so one caller being cancelled doesn't cancel the call for the others
+    return await asyncio.shield(task)